@@ -0,0 +1,55 @@
+"""
+Бенчмарк очереди исходящих сообщений на локальном FakeBot.
+
+Пример запуска из корня репозитория:
+
+    python -m benchmarks.dispatcher_bench --chats 300 --per-chat 3
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.fakebot import FakeBot
+from dispatcher import OutboundDispatcher
+
+
+async def run(chats, per_chat, rate, latency):
+    bot = FakeBot(latency=latency, global_rate=rate)
+    dispatcher = OutboundDispatcher(bot, rate=rate)
+    dispatcher.start()
+
+    started = time.monotonic()
+    for chat_id in range(chats):
+        dispatcher.edit_message_text(chat_id, 1, "Таймер завершен! Время события истекло!")
+        for _ in range(per_chat - 1):
+            dispatcher.send_message(chat_id, "Напоминание: событие приближается!")
+    await dispatcher.join()
+    elapsed = time.monotonic() - started
+    await dispatcher.stop()
+
+    return {
+        'queued': chats * per_chat,
+        'requests': len(bot.calls),
+        'merged': dispatcher.merged,
+        'retry_after': bot.retry_after,
+        'failed': dispatcher.failed,
+        'elapsed_s': round(elapsed, 3),
+        'requests_per_s': round(len(bot.calls) / elapsed, 2) if elapsed else None,
+        'messages_per_s': round(chats * per_chat / elapsed, 2) if elapsed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--chats', type=int, default=300)
+    parser.add_argument('--per-chat', type=int, default=3)
+    parser.add_argument('--rate', type=float, default=30)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.chats, args.per_chat, args.rate, args.latency))
+    print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+BOT_USER = {
+    'id': 1,
+    'is_bot': True,
+    'first_name': 'Fake',
+    'username': 'fake_timer_bot',
+}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def _decode_params(body, content_type):
+    if not body:
+        return {}
+    if content_type.startswith('application/json'):
+        return json.loads(body)
+    params = {}
+    for key, values in parse_qs(body.decode()).items():
+        try:
+            params[key] = json.loads(values[0])
+        except ValueError:
+            params[key] = values[0]
+    return params
+
+
+class FakeBotApi:
+    """
+    Локальный HTTP-сервер, отвечающий как Telegram Bot API.
+
+    Бот подключается к нему через TELEGRAM_BASE_URL. Сервер отдает
+    поставленные в очередь обновления через getUpdates и сообщает
+    о каждом вызове метода в on_call(method, params).
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, on_call=None):
+        self.on_call = on_call
+        self._updates = deque()
+        self._updates_ready = threading.Condition()
+        self._message_id = 0
+        self._lock = threading.Lock()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                method = self.path.rsplit('/', 1)[-1]
+                length = int(self.headers.get('Content-Length') or 0)
+                params = _decode_params(
+                    self.rfile.read(length), self.headers.get('Content-Type', '')
+                )
+                body = json.dumps({'ok': True, 'result': api.handle(method, params)}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _Server((host, port), Handler)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/bot'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def push_updates(self, updates):
+        """Ставит обновления в очередь для getUpdates."""
+        with self._updates_ready:
+            self._updates.extend(updates)
+            self._updates_ready.notify_all()
+
+    def _message(self, params):
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+        return {
+            'message_id': params.get('message_id', message_id),
+            'date': int(time.time()),
+            'chat': {'id': params.get('chat_id'), 'type': 'private'},
+            'text': params.get('text', ''),
+        }
+
+    def _get_updates(self, params):
+        offset = params.get('offset') or 0
+        limit = params.get('limit') or 100
+        deadline = time.monotonic() + (params.get('timeout') or 0)
+        with self._updates_ready:
+            while self._updates and self._updates[0]['update_id'] < offset:
+                self._updates.popleft()
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._updates_ready.wait(remaining)
+            return [self._updates[i] for i in range(min(limit, len(self._updates)))]
+
+    def handle(self, method, params):
+        if self.on_call is not None:
+            self.on_call(method, params)
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'getUpdates':
+            return self._get_updates(params)
+        if method in ('sendMessage', 'editMessageText'):
+            return self._message(params)
+        return True
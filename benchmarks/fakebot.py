@@ -0,0 +1,78 @@
+import asyncio
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+
+
+class SentMessage:
+    """Ответ FakeBot на отправку: только поля, которые читает бот."""
+
+    __slots__ = ('message_id', 'chat_id', 'text')
+
+    def __init__(self, message_id, chat_id, text):
+        self.message_id = message_id
+        self.chat_id = chat_id
+        self.text = text
+
+
+class FakeBot:
+    """
+    Локальная замена telegram.Bot для бенчмарков.
+
+    Записывает вызовы, имитирует сетевую задержку и, как Telegram,
+    отвечает RetryAfter при превышении глобального лимита или лимита
+    на один чат.
+    """
+
+    def __init__(self, latency=0.0, global_rate=30, chat_interval=1.0,
+                 retry_after=1, enforce_limits=True, record=True):
+        self.latency = latency
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.retry_after_seconds = retry_after
+        self.enforce_limits = enforce_limits
+        self.record = record
+        self.count = 0
+        self.calls = []  # (monotonic, method, chat_id, text)
+        self.retry_after = 0
+        self._window = deque()
+        self._last_by_chat = {}
+        self._message_id = 0
+
+    def _check_limits(self, chat_id):
+        now = time.monotonic()
+        if not self.enforce_limits:
+            return now
+        window = self._window
+        while window and now - window[0] >= 1.0:
+            window.popleft()
+        last = self._last_by_chat.get(chat_id)
+        # Небольшой допуск на неточность часов event loop
+        if len(window) >= self.global_rate * 1.1 or (
+            last is not None and now - last < self.chat_interval * 0.9
+        ):
+            self.retry_after += 1
+            raise RetryAfter(self.retry_after_seconds)
+        window.append(now)
+        self._last_by_chat[chat_id] = now
+        return now
+
+    async def _call(self, method, chat_id, text):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        now = self._check_limits(chat_id)
+        self.count += 1
+        if self.record:
+            self.calls.append((now, method, chat_id, text))
+        self._message_id += 1
+        return SentMessage(self._message_id, chat_id, text)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return await self._call('send_message', chat_id, text)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        return await self._call('edit_message_text', chat_id, text)
+
+    async def answer_callback_query(self, *args, **kwargs):
+        return True
@@ -0,0 +1,222 @@
+"""
+Офлайн-бенчмарк обработчиков бота и точности срабатывания таймеров.
+
+Обработчики вызываются напрямую с синтетическими Update поверх FakeBot,
+поэтому токен Telegram не нужен. Результат печатается в JSON; с
+--baseline сравнивается с прошлым прогоном и завершается с кодом 1,
+если латентность, аллокации или джиттер выросли больше допуска.
+
+    python -m benchmarks.suite --users 100000 --timers 50000 --window 60
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from telegram import Update
+
+import timerbot
+from benchmarks.fakebot import FakeBot
+from benchmarks.synthetic import callback_update, message_update
+from callbacks import date_data, month_data, time_data
+from scheduler import TimerEntry
+from service import TimerService
+from session import SessionStore
+from storage import SqliteTimerStore
+
+
+def _percentiles(values, scale=1000.0):
+    """p50/p99/max в миллисекундах."""
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+    last = len(values) - 1
+    return {
+        'count': len(values),
+        'p50_ms': round(values[int(last * 0.5)] * scale, 4),
+        'p99_ms': round(values[int(last * 0.99)] * scale, 4),
+        'max_ms': round(values[last] * scale, 4),
+    }
+
+
+def _calendar_flow(chat_id, update_id):
+    """Шаги одного пользователя: /start, следующий месяц, дата, время."""
+    today = datetime.now()
+    tomorrow = today + timedelta(days=1)
+    next_month = today.month % 12 + 1
+    next_year = today.year + (today.month == 12)
+    return [
+        ('start', timerbot.start, message_update(update_id, chat_id, '/start')),
+        ('button:month', timerbot.button,
+         callback_update(update_id + 1, chat_id, month_data(next_year, next_month))),
+        ('button:date', timerbot.button,
+         callback_update(update_id + 2, chat_id,
+                         date_data(tomorrow.year, tomorrow.month, tomorrow.day))),
+        ('button:time', timerbot.button,
+         callback_update(update_id + 3, chat_id, time_data(0, 30))),
+    ]
+
+
+async def calendar_workload(users, alloc_sample):
+    """N пользователей проходят сценарий календаря; латентность и аллокации по шагам."""
+    bot = FakeBot(enforce_limits=False, record=False)
+    # horizon=0: все созданные записи остаются в планировщике и считаются ниже
+    service = TimerService(bot, SqliteTimerStore(':memory:'), send_rate=1e9, horizon=0)
+    await service.start()
+    context = SimpleNamespace(application=SimpleNamespace(
+        bot_data={'timers': service, 'sessions': SessionStore()},
+    ))
+
+    latencies = defaultdict(list)
+    perf_counter = time.perf_counter
+    started = perf_counter()
+    for user in range(users):
+        for name, handler, payload in _calendar_flow(10_000_000 + user, user * 4 + 1):
+            update = Update.de_json(payload, bot)
+            begin = perf_counter()
+            await handler(update, context)
+            latencies[name].append(perf_counter() - begin)
+    elapsed = perf_counter() - started
+
+    # Отдельный проход под tracemalloc, чтобы он не искажал латентность
+    allocations = defaultdict(list)
+    tracemalloc.start()
+    for user in range(alloc_sample):
+        for name, handler, payload in _calendar_flow(20_000_000 + user, user * 4 + 1):
+            update = Update.de_json(payload, bot)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            await handler(update, context)
+            allocations[name].append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    pending = len(service.scheduler)
+    await service.stop()
+    return {
+        'users': users,
+        'updates': users * 4,
+        'elapsed_s': round(elapsed, 3),
+        'updates_per_s': round(users * 4 / elapsed, 1) if elapsed else None,
+        'timers_created': pending,
+        'handlers': {
+            name: dict(
+                _percentiles(values),
+                alloc_peak_bytes=(
+                    round(sum(allocations[name]) / len(allocations[name]))
+                    if allocations[name] else None
+                ),
+            )
+            for name, values in latencies.items()
+        },
+    }
+
+
+async def timers_workload(count, window):
+    """
+    count таймеров с равномерными сроками в пределах window секунд через
+    TimerService; джиттер — задержка отправки сообщения после срока.
+    """
+    bot = FakeBot(enforce_limits=False)
+    service = TimerService(bot, SqliteTimerStore(':memory:'), send_rate=1e9)
+    await service.start()
+    # FakeBot пишет monotonic, сроки таймеров — по time.time()
+    offset = time.time() - time.monotonic()
+    base = time.time() + 1.0
+    entries = [
+        TimerEntry(base + window * index / count, 30_000_000 + index, index)
+        for index in range(count)
+    ]
+    service.add(entries)
+    deadline = time.monotonic() + window + 30
+    while bot.count < count and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    dispatcher = service.dispatcher
+    queued = len(dispatcher)
+    await service.stop()
+
+    due = {entry.chat_id: entry.due for entry in entries}
+    jitter = [sent + offset - due[chat_id] for sent, _, chat_id, _ in bot.calls]
+    return {
+        'timers': count,
+        'window_s': window,
+        'sent': len(jitter),
+        'queued_messages': queued,
+        'failed': dispatcher.failed,
+        'jitter': _percentiles(jitter),
+    }
+
+
+def _flatten(result, prefix=''):
+    for key, value in result.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            yield from _flatten(value, name + '.')
+        else:
+            yield name, value
+
+
+def compare(result, baseline, tolerance):
+    """Список регрессий: метрики *_ms и *_bytes, выросшие больше чем на tolerance."""
+    current = dict(_flatten(result))
+    regressions = []
+    for name, old in _flatten(baseline):
+        if not name.endswith(('_ms', '_bytes')) or not old:
+            continue
+        new = current.get(name)
+        if new is not None and new > old * (1 + tolerance):
+            regressions.append({'metric': name, 'baseline': old, 'current': new})
+    return regressions
+
+
+async def run(args):
+    result = {
+        'meta': {
+            'python': platform.python_version(),
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+        },
+    }
+    if args.users:
+        result['calendar'] = await calendar_workload(args.users, args.alloc_sample)
+    if args.timers:
+        result['timers'] = await timers_workload(args.timers, args.window)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=100_000,
+                        help='пользователей в сценарии календаря (0 — пропустить)')
+    parser.add_argument('--alloc-sample', type=int, default=1000,
+                        help='пользователей в проходе с подсчетом аллокаций')
+    parser.add_argument('--timers', type=int, default=50_000,
+                        help='таймеров с одним окном срабатывания (0 — пропустить)')
+    parser.add_argument('--window', type=float, default=60,
+                        help='окно срабатывания таймеров, секунд')
+    parser.add_argument('--output', help='записать результат в JSON-файл')
+    parser.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='допустимый рост метрик относительно baseline')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline:
+            result['regressions'] = compare(result, json.load(baseline), args.tolerance)
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            output.write(text)
+    print(text)
+    if result.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Синтетические обновления Telegram в формате Bot API (JSON-словари)."""
+import time
+
+
+def _user(chat_id):
+    return {'id': chat_id, 'is_bot': False, 'first_name': 'Load'}
+
+
+def _chat(chat_id):
+    return {'id': chat_id, 'type': 'private'}
+
+
+def message_update(update_id, chat_id, text):
+    """Обновление с текстовым сообщением; команды размечаются как bot_command."""
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': _chat(chat_id),
+        'from': _user(chat_id),
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [
+            {'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}
+        ]
+    return {'update_id': update_id, 'message': message}
+
+
+def callback_update(update_id, chat_id, data, message_id=1):
+    """Обновление с нажатием inline-кнопки под сообщением бота."""
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': _user(chat_id),
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': _chat(chat_id),
+                'text': 'Выберите дату для таймера:',
+            },
+        },
+    }
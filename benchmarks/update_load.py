@@ -0,0 +1,165 @@
+"""
+Нагрузочный тест приема обновлений в режимах webhook и polling.
+
+Запускает бота отдельным процессом против локального FakeBotApi,
+подает синтетические команды /start (POST на webhook-сервер бота или
+через getUpdates) и измеряет время до ответа бота.
+
+    python -m benchmarks.update_load --mode webhook --updates 2000 --chats 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+
+import httpx
+
+from benchmarks.fake_api import FakeBotApi
+from benchmarks.synthetic import message_update
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = 'load-test-secret'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def _wait_port(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise TimeoutError(f'webhook-сервер не поднялся на порту {port}')
+
+
+async def run(mode, updates, chats, concurrency, timeout):
+    sent_at = defaultdict(deque)  # chat_id -> времена отправки обновлений
+    latencies = []
+    answered = threading.Event()
+    lock = threading.Lock()
+    webhook_ready = threading.Event()
+
+    def on_call(method, params):
+        if method == 'setWebhook':
+            webhook_ready.set()
+        if method != 'sendMessage':
+            return
+        with lock:
+            queue = sent_at.get(params.get('chat_id'))
+            if queue:
+                latencies.append(time.monotonic() - queue.popleft())
+            if len(latencies) >= updates:
+                answered.set()
+
+    api = FakeBotApi(on_call=on_call)
+    api.start()
+    port = _free_port()
+    workdir = tempfile.mkdtemp(prefix='timerbot-load-')
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN='123456:load-test',
+        TELEGRAM_BASE_URL=api.base_url,
+        TIMER_DB_PATH=os.path.join(workdir, 'timers.db'),
+        BOT_MODE=mode,
+        WEBHOOK_LISTEN='127.0.0.1',
+        WEBHOOK_PORT=str(port),
+        WEBHOOK_PATH='telegram',
+        WEBHOOK_SECRET=SECRET,
+        MAX_CONCURRENT_UPDATES=str(concurrency),
+    )
+    bot = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'timerbot.py')], cwd=workdir, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    payloads = [
+        message_update(update_id, 1000 + update_id % chats, '/start')
+        for update_id in range(1, updates + 1)
+    ]
+
+    try:
+        started = None
+        if mode == 'webhook':
+            await _wait_port(port, timeout)
+            await asyncio.to_thread(webhook_ready.wait, timeout)
+            url = f'http://127.0.0.1:{port}/telegram'
+            headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET}
+            limits = asyncio.Semaphore(concurrency)
+
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                async def post(payload):
+                    async with limits:
+                        with lock:
+                            sent_at[payload['message']['chat']['id']].append(time.monotonic())
+                        await client.post(url, json=payload, headers=headers)
+
+                started = time.monotonic()
+                await asyncio.gather(*(post(payload) for payload in payloads))
+        else:
+            started = time.monotonic()
+            with lock:
+                for payload in payloads:
+                    sent_at[payload['message']['chat']['id']].append(started)
+            api.push_updates(payloads)
+
+        completed = await asyncio.to_thread(answered.wait, timeout)
+        elapsed = time.monotonic() - started
+    finally:
+        bot.send_signal(signal.SIGINT)
+        try:
+            bot.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+        api.stop()
+
+    return {
+        'mode': mode,
+        'updates': updates,
+        'chats': chats,
+        'concurrency': concurrency,
+        'answered': len(latencies),
+        'completed': completed,
+        'elapsed_s': round(elapsed, 3),
+        'updates_per_s': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'latency_p50_ms': round(_percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        'latency_p99_ms': round(_percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--mode', choices=('webhook', 'polling'), default='webhook')
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+    result = asyncio.run(
+        run(args.mode, args.updates, args.chats, args.concurrency, args.timeout)
+    )
+    print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
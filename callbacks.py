@@ -0,0 +1,214 @@
+"""
+Компактный формат callback_data и таблица обработчиков кнопок.
+
+Формат версии 1: символ версии, однобайтовый код операции и целые
+числа в base36. Например, '1dfuwz' — выбор 2026-10-18 по порядковому
+номеру даты, '1mirl' — показ октября 2026 по индексу year * 12 + month - 1.
+Кнопки без действия используют отдельную строку IGNORE, которую
+обработчик отбрасывает без разбора.
+"""
+import logging
+import time
+from datetime import MAXYEAR, MINYEAR, datetime
+
+from metrics import HANDLER_LATENCY
+
+logger = logging.getLogger(__name__)
+
+VERSION = '1'
+IGNORE = '.'
+
+# Коды операций
+OP_MONTH = 'm'  # Показать месяц календаря
+OP_DATE = 'd'  # Выбрать дату
+OP_TIME = 't'  # Выбрать время из списка
+OP_MANUAL = 'h'  # Ввести время вручную
+OP_BACK = 'b'  # Вернуться к календарю
+OP_LIST = 'l'  # Страница списка таймеров
+OP_CANCEL_PAGE = 'c'  # Страница списка для отмены
+OP_CANCEL = 'x'  # Отменить таймер
+
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+_MAX_INT = 2 ** 63 - 1  # Целые идут в SQLite
+
+
+def _base36(number):
+    if number == 0:
+        return '0'
+    digits = []
+    while number:
+        number, rest = divmod(number, 36)
+        digits.append(_DIGITS[rest])
+    return ''.join(reversed(digits))
+
+
+def month_data(year, month):
+    """callback_data для показа месяца календаря."""
+    return f'{VERSION}{OP_MONTH}{_base36(year * 12 + month - 1)}'
+
+
+def date_data(year, month, day):
+    """callback_data для выбора даты."""
+    return f'{VERSION}{OP_DATE}{_base36(datetime(year, month, day).toordinal())}'
+
+
+def time_data(hour, minute):
+    """callback_data для выбора времени."""
+    return f'{VERSION}{OP_TIME}{_base36(hour * 60 + minute)}'
+
+
+def list_data(offset):
+    """callback_data для страницы списка таймеров."""
+    return f'{VERSION}{OP_LIST}{_base36(offset)}'
+
+
+def cancel_page_data(offset):
+    """callback_data для страницы списка отмены."""
+    return f'{VERSION}{OP_CANCEL_PAGE}{_base36(offset)}'
+
+
+def cancel_data(message_id, offset):
+    """callback_data для отмены таймера с возвратом на ту же страницу."""
+    return f'{VERSION}{OP_CANCEL}{_base36(message_id)}.{_base36(offset)}'
+
+
+MANUAL_DATA = VERSION + OP_MANUAL
+BACK_DATA = VERSION + OP_BACK
+
+
+# callback_data присылает клиент, поэтому декодеры проверяют диапазоны:
+# значение, которое разобралось, не должно уронить обработчик
+
+
+def _int36(payload):
+    # int() допускает знак, пробелы и подчеркивания — принимаем только цифры
+    if not payload or payload.strip(_DIGITS):
+        raise ValueError(f'bad base36 payload: {payload!r}')
+    number = int(payload, 36)
+    if number > _MAX_INT:
+        raise ValueError(f'base36 payload out of range: {payload!r}')
+    return number
+
+
+def _check_year(year):
+    # Календарь строит соседние месяцы, поэтому крайние годы не допускаются
+    if not MINYEAR < year < MAXYEAR:
+        raise ValueError(f'year out of range: {year}')
+    return year
+
+
+def _check_time(hour, minute):
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f'time out of range: {hour}:{minute}')
+    return hour, minute
+
+
+def _decode_month(payload):
+    year, month = divmod(_int36(payload), 12)
+    return _check_year(year), month + 1
+
+
+def _decode_date(payload):
+    target_date = datetime.fromordinal(_int36(payload))
+    _check_year(target_date.year)
+    return (target_date,)
+
+
+def _decode_time(payload):
+    return _check_time(*divmod(_int36(payload), 60))
+
+
+def _decode_int(payload):
+    return (_int36(payload),)
+
+
+def _decode_pair(payload):
+    first, second = payload.split('.')
+    return _int36(first), _int36(second)
+
+
+def _decode_empty(payload):
+    return ()
+
+
+_DECODERS = {
+    OP_MONTH: _decode_month,
+    OP_DATE: _decode_date,
+    OP_TIME: _decode_time,
+    OP_MANUAL: _decode_empty,
+    OP_BACK: _decode_empty,
+    OP_LIST: _decode_int,
+    OP_CANCEL_PAGE: _decode_int,
+    OP_CANCEL: _decode_pair,
+}
+
+
+def _decode_legacy(data):
+    """Разбирает callback_data старого формата из уже отправленных клавиатур."""
+    if data.startswith('prev_month') or data.startswith('next_month'):
+        year, month = map(int, data.split('-')[1:])
+        index = year * 12 + month - 1 + (1 if data[0] == 'n' else -1)
+        year, month = divmod(index, 12)
+        return OP_MONTH, (_check_year(year), month + 1)
+    if data == 'back':
+        return OP_BACK, ()
+    if data.startswith('date_'):
+        target_date = datetime.strptime(data[5:], '%Y-%m-%d')
+        _check_year(target_date.year)
+        return OP_DATE, (target_date,)
+    if data == 'time_manual':
+        return OP_MANUAL, ()
+    if data.startswith('time_'):
+        hour, minute = map(int, data[5:].split(':'))
+        return OP_TIME, _check_time(hour, minute)
+    return None
+
+
+def decode(data):
+    """
+    Возвращает (код операции, аргументы) или None для неизвестных данных.
+    Некорректные данные поднимают ValueError или OverflowError.
+    """
+    if data[:1] == VERSION:
+        op = data[1:2]
+        decoder = _DECODERS.get(op)
+        if decoder is None:
+            return None
+        return op, decoder(data[2:])
+    return _decode_legacy(data)
+
+
+class CallbackRouter:
+    """Таблица обработчиков нажатий кнопок по коду операции."""
+
+    def __init__(self):
+        self._handlers = {}
+
+    def route(self, op):
+        """Декоратор: регистрирует обработчик handler(update, context, *args)."""
+        def register(handler):
+            self._handlers[op] = (handler, HANDLER_LATENCY.labels(f'callback:{op}'))
+            return handler
+        return register
+
+    async def dispatch(self, update, context):
+        """Разбирает callback_data за один проход и вызывает обработчик."""
+        data = update.callback_query.data
+        try:
+            decoded = decode(data)
+        except (ValueError, OverflowError):
+            decoded = None
+        if decoded is None:
+            logger.warning('Неизвестные данные кнопки: %r', data)
+            return None
+        op, args = decoded
+        route = self._handlers.get(op)
+        if route is None:
+            logger.warning('Нет обработчика для операции %r', op)
+            return None
+        handler, latency = route
+        started = time.perf_counter()
+        try:
+            return await handler(update, context, *args)
+        finally:
+            latency.observe(time.perf_counter() - started)
@@ -0,0 +1,84 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+
+class ChatIndex:
+    """
+    Кэш ожидающих таймеров недавно активных чатов.
+
+    Для каждого чата хранит отсортированный по сроку список (due,
+    message_id) и словарь message_id -> due: страница списка берется
+    срезом за O(k), а отмена находит таймер бинарным поиском. Сработавшие
+    таймеры стоят в начале списка и отбрасываются при чтении.
+
+    Чат попадает в кэш через load при первом запросе и вытесняется,
+    когда кэшированных чатов больше max_chats. add и remove меняют только
+    уже загруженные чаты: остальные прочитаются из хранилища целиком.
+    """
+
+    def __init__(self, max_chats=10000):
+        self.max_chats = max_chats
+        # chat_id -> (список (due, message_id), {message_id: due}), от давних к недавним
+        self._chats = OrderedDict()
+
+    def __len__(self):
+        return sum(len(dues) for _, dues in self._chats.values())
+
+    def __contains__(self, chat_id):
+        return chat_id in self._chats
+
+    def load(self, chat_id, items):
+        """Кладет в кэш таймеры чата [(due, message_id)], отсортированные по сроку."""
+        chats = self._chats
+        chats[chat_id] = (items, {message_id: due for due, message_id in items})
+        chats.move_to_end(chat_id)
+        while len(chats) > self.max_chats:
+            chats.popitem(last=False)
+
+    def add(self, chat_id, message_id, due):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            return
+        items, dues = chat
+        if message_id in dues:
+            self._remove(items, dues, message_id)
+        insort(items, (due, message_id))
+        dues[message_id] = due
+
+    def remove(self, chat_id, message_id):
+        """Удаляет таймер; возвращает его срок или None, если таймера нет."""
+        chat = self._chats.get(chat_id)
+        if chat is None or message_id not in chat[1]:
+            return None
+        return self._remove(chat[0], chat[1], message_id)
+
+    @staticmethod
+    def _remove(items, dues, message_id):
+        due = dues.pop(message_id)
+        del items[bisect_left(items, (due, message_id))]
+        return due
+
+    def get(self, chat_id, message_id):
+        """Срок таймера или None."""
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            return None
+        self._chats.move_to_end(chat_id)
+        return chat[1].get(message_id)
+
+    def page(self, chat_id, offset, limit, now):
+        """
+        Возвращает (таймеры страницы [(due, message_id)], всего таймеров),
+        предварительно отбросив уже сработавшие.
+        """
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            return [], 0
+        self._chats.move_to_end(chat_id)
+        items, dues = chat
+        expired = bisect_left(items, (now, float('inf')))
+        if expired:
+            for _, message_id in items[:expired]:
+                del dues[message_id]
+            del items[:expired]
+        return items[offset:offset + limit], len(items)
@@ -0,0 +1,351 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import timedelta
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты исходящих сообщений: меньше — важнее
+PRIORITY_TIMER = 0
+PRIORITY_REMINDER = 1
+
+# Лимит длины сообщения Telegram: склеенные тексты не должны его превышать
+MAX_MESSAGE_LENGTH = 4096
+
+# Состояния очереди чата
+_IDLE = 0
+_READY = 1
+_DELAYED = 2
+
+
+class TokenBucket:
+    """Глобальный лимит запросов в секунду с допустимым всплеском."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity=None, now=0.0):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = now
+
+    def take(self, now):
+        """Забирает токен и возвращает 0 или время ожидания до следующего токена."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class _ChatQueue:
+    """Ожидающие отправки сообщения одного чата."""
+
+    __slots__ = (
+        'edits', 'texts', 'text_priority', 'text_attempts',
+        'next_allowed', 'state', 'queued', 'version'
+    )
+
+    def __init__(self):
+        # message_id -> (text, priority, attempts, tokens), последняя правка побеждает
+        self.edits = {}
+        self.texts = []  # (text, tokens) новых сообщений, которые будут склеены
+        self.text_priority = PRIORITY_REMINDER
+        self.text_attempts = 0
+        self.next_allowed = 0.0
+        self.state = _IDLE
+        self.queued = None  # Приоритет, с которым чат стоит в очереди готовых
+        self.version = 0
+
+    def __bool__(self):
+        return bool(self.edits or self.texts)
+
+    def priority(self):
+        if self.edits:
+            return min(priority for _, priority, _, _ in self.edits.values())
+        return self.text_priority
+
+    def pop_request(self):
+        """Забирает следующий запрос: сначала правки, затем склеенные сообщения."""
+        if self.edits:
+            message_id = min(self.edits, key=lambda key: self.edits[key][1])
+            text, priority, attempts, tokens = self.edits.pop(message_id)
+            return ('edit', message_id, text, priority, attempts, tokens)
+        # Склеиваем тексты, пока сообщение укладывается в лимит Telegram;
+        # остальные ждут следующего запроса со своими метками
+        texts = self.texts
+        length = len(texts[0][0])
+        count = 1
+        while count < len(texts) and length + 2 + len(texts[count][0]) <= MAX_MESSAGE_LENGTH:
+            length += 2 + len(texts[count][0])
+            count += 1
+        batch = texts[:count]
+        del texts[:count]
+        attempts, self.text_attempts = self.text_attempts, 0
+        return (
+            'send', None, '\n\n'.join(text for text, _ in batch), self.text_priority,
+            attempts, [token for _, tokens in batch for token in tokens]
+        )
+
+
+class OutboundDispatcher:
+    """
+    Очередь исходящих сообщений с ограничением скорости.
+
+    Все отправки таймеров проходят через общий token bucket (~30 запросов
+    в секунду) и минимальный интервал между сообщениями одному чату.
+    Завершения таймеров уходят раньше напоминаний, несколько сообщений
+    одному чату склеиваются в одно, а RetryAfter приостанавливает
+    отправку на указанное время.
+
+    Метки token, переданные с сообщениями, возвращаются в on_done(tokens)
+    только когда сообщение отправлено или окончательно отклонено. Все,
+    что осталось в очереди при остановке или отброшено после
+    max_attempts сетевых ошибок, отправляется после перезапуска.
+    RetryAfter попыткой не считается.
+    """
+
+    def __init__(self, bot, rate=30, burst=1, per_chat_interval=1.0,
+                 max_in_flight=64, max_attempts=5, clock=time.monotonic,
+                 on_done=None):
+        self._bot = bot
+        self._on_done = on_done
+        self._clock = clock
+        self._bucket = TokenBucket(rate, burst, now=clock())
+        self._per_chat_interval = per_chat_interval
+        self._max_attempts = max_attempts
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._chats = {}
+        self._ready = []  # (priority, seq, chat_id, version)
+        self._delayed = []  # (next_allowed, seq, chat_id, version)
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._inflight = set()
+        self._task = None
+        self.sent = 0
+        self.merged = 0
+        self.retry_after = 0
+        self.failed = 0
+
+    def __len__(self):
+        return sum(len(chat.edits) + len(chat.texts) for chat in self._chats.values())
+
+    def edit_message_text(self, chat_id, message_id, text, priority=PRIORITY_TIMER,
+                          token=None):
+        """Ставит в очередь правку сообщения."""
+        chat = self._chat(chat_id)
+        pending = chat.edits.get(message_id)
+        if pending is not None:
+            self.merged += 1
+            tokens = pending[3]
+        else:
+            tokens = []
+        if token is not None:
+            tokens.append(token)
+        chat.edits[message_id] = (text, priority, 0, tokens)
+        self._touch(chat_id, chat, priority)
+
+    def send_message(self, chat_id, text, priority=PRIORITY_REMINDER, token=None):
+        """Ставит в очередь новое сообщение, склеивая его с ожидающими."""
+        chat = self._chat(chat_id)
+        if chat.texts:
+            self.merged += 1
+            chat.text_priority = min(chat.text_priority, priority)
+        else:
+            chat.text_priority = priority
+        chat.texts.append((text, [token] if token is not None else []))
+        self._touch(chat_id, chat, priority)
+
+    def _chat(self, chat_id):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _ChatQueue()
+        return chat
+
+    def _touch(self, chat_id, chat, priority):
+        # Чат уже ждет своей очереди с не худшим приоритетом
+        if chat.state == _DELAYED or (chat.state == _READY and chat.queued <= priority):
+            return
+        self._enqueue(chat_id, chat, self._clock())
+        self._wakeup.set()
+
+    def _enqueue(self, chat_id, chat, now):
+        chat.version += 1
+        if chat.next_allowed > now:
+            chat.state = _DELAYED
+            heapq.heappush(
+                self._delayed, (chat.next_allowed, next(self._seq), chat_id, chat.version)
+            )
+        else:
+            chat.state = _READY
+            chat.queued = chat.priority()
+            heapq.heappush(
+                self._ready, (chat.queued, next(self._seq), chat_id, chat.version)
+            )
+
+    def _expire(self, chat_id, chat):
+        # Пустой чат хранится, пока действует его интервал, затем удаляется
+        chat.version += 1
+        chat.state = _IDLE
+        heapq.heappush(
+            self._delayed, (chat.next_allowed, next(self._seq), chat_id, chat.version)
+        )
+
+    def _promote(self, now):
+        delayed = self._delayed
+        while delayed and delayed[0][0] <= now:
+            _, _, chat_id, version = heapq.heappop(delayed)
+            chat = self._chats.get(chat_id)
+            if chat is None or chat.version != version:
+                continue
+            if chat:
+                self._enqueue(chat_id, chat, now)
+            else:
+                del self._chats[chat_id]
+
+    def _pop_ready(self):
+        ready = self._ready
+        while ready:
+            _, _, chat_id, version = heapq.heappop(ready)
+            chat = self._chats.get(chat_id)
+            if chat is not None and chat.version == version:
+                return chat_id, chat
+        return None, None
+
+    def start(self):
+        """Запускает корутину отправки на текущем event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        """Останавливает отправку, дожидаясь запросов в полете."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    async def join(self):
+        """Ждет, пока очередь и запросы в полете не опустеют."""
+        while len(self) or self._inflight:
+            await asyncio.sleep(0.01)
+
+    async def _run(self):
+        while True:
+            now = self._clock()
+            self._promote(now)
+            if not self._ready:
+                self._wakeup.clear()
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            wait = self._bucket.take(now)
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+
+            chat_id, chat = self._pop_ready()
+            if chat is None:
+                continue
+            request = chat.pop_request()
+            chat.next_allowed = now + self._per_chat_interval
+            if chat:
+                self._enqueue(chat_id, chat, now)
+            else:
+                self._expire(chat_id, chat)
+
+            await self._slots.acquire()
+            task = asyncio.get_running_loop().create_task(self._send(chat_id, request))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, chat_id, request):
+        kind, message_id, text, priority, attempts, tokens = request
+        try:
+            if kind == 'edit':
+                await self._bot.edit_message_text(
+                    chat_id=chat_id, message_id=message_id, text=text
+                )
+            else:
+                await self._bot.send_message(chat_id=chat_id, text=text)
+            self.sent += 1
+            self._done(tokens)
+        except RetryAfter as exc:
+            self.retry_after += 1
+            delay = exc.retry_after
+            if isinstance(delay, timedelta):
+                delay = delay.total_seconds()
+            self._retry(chat_id, request, delay, pause=True, attempt=False)
+        except BadRequest as exc:
+            # Подкласс NetworkError, но повтор не поможет: сообщение удалено,
+            # не изменилось и т. п.
+            self.failed += 1
+            logger.warning('Telegram отклонил сообщение в чат %s: %s', chat_id, exc)
+            self._done(tokens)
+        except (TimedOut, NetworkError) as exc:
+            # Экспоненциальная задержка для временных сетевых ошибок
+            logger.debug('Временная ошибка отправки в чат %s: %s', chat_id, exc)
+            self._retry(chat_id, request, 2 ** attempts, pause=False)
+        except Exception as exc:
+            self.failed += 1
+            logger.warning('Не удалось отправить сообщение в чат %s: %s', chat_id, exc)
+            self._done(tokens)
+        finally:
+            self._slots.release()
+
+    def _done(self, tokens):
+        if tokens and self._on_done is not None:
+            self._on_done(tokens)
+
+    def _retry(self, chat_id, request, delay, pause, attempt=True):
+        kind, message_id, text, priority, attempts, tokens = request
+        if attempt:
+            attempts += 1
+            if attempts >= self._max_attempts:
+                # Метки не возвращаются: записи остаются в хранилище
+                # несработавшими и уйдут после перезапуска
+                self.failed += 1
+                logger.warning(
+                    'Сообщение в чат %s отложено до перезапуска после %d попыток',
+                    chat_id, attempts
+                )
+                return
+        now = self._clock()
+        if pause:
+            self._paused_until = max(self._paused_until, now + delay)
+        chat = self._chat(chat_id)
+        if kind == 'edit':
+            # Более новая правка того же сообщения вытесняет повтор
+            pending = chat.edits.get(message_id)
+            if pending is None:
+                chat.edits[message_id] = (text, priority, attempts, tokens)
+            else:
+                pending[3].extend(tokens)
+        else:
+            if not chat.texts:
+                chat.text_priority = priority
+            chat.texts.insert(0, (text, tokens))
+            chat.text_priority = min(chat.text_priority, priority)
+            chat.text_attempts = attempts
+        chat.next_allowed = max(chat.next_allowed, now + delay)
+        if chat.state != _DELAYED:
+            self._enqueue(chat_id, chat, now)
+        self._wakeup.set()
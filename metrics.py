@@ -0,0 +1,261 @@
+"""
+Встроенные метрики и HTTP-эндпоинт в текстовом формате Prometheus.
+
+Счетчики и гистограммы меняются только из потока event loop, поэтому
+обходятся без блокировок: обновление — пара операций над int и float.
+Значения, которые дешевле прочитать, чем поддерживать (глубина очереди,
+размер кэша), собираются функциями-коллекторами в момент запроса.
+"""
+import asyncio
+import functools
+import logging
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _StackCounter
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+DELAY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 60.0, 300.0)
+
+
+def _labels(name, value):
+    return f'{{{name}="{value}"}}' if name else ''
+
+
+class Counter:
+    """Монотонный счетчик."""
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Последняя корзина — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Family:
+    """Метрика с необязательной одной меткой."""
+
+    def __init__(self, name, help, kind, label, factory):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label = label
+        self._factory = factory
+        self._children = {}
+
+    def labels(self, value=''):
+        child = self._children.get(value)
+        if child is None:
+            child = self._children[value] = self._factory()
+        return child
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for value, child in sorted(self._children.items()):
+            if self.kind == 'counter':
+                lines.append(f'{self.name}{_labels(self.label, value)} {child.value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(child.buckets + (float('inf'),), child.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                prefix = f'{self.label}="{value}",' if self.label else ''
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label, value)} {child.sum}')
+            lines.append(f'{self.name}_count{_labels(self.label, value)} {child.count}')
+        return lines
+
+
+class Registry:
+    """Набор метрик процесса и коллекторов, вычисляемых при запросе."""
+
+    def __init__(self):
+        self._families = []
+        self._collectors = []
+
+    def counter(self, name, help, label=None):
+        family = _Family(name, help, 'counter', label, Counter)
+        self._families.append(family)
+        return family
+
+    def histogram(self, name, help, label=None, buckets=LATENCY_BUCKETS):
+        family = _Family(name, help, 'histogram', label, lambda: Histogram(buckets))
+        self._families.append(family)
+        return family
+
+    def collector(self, name, help, func, kind='gauge', label=None):
+        """
+        Регистрирует значение, читаемое при запросе: func() возвращает
+        число или словарь {значение метки: число}.
+        """
+        self._collectors.append((name, help, kind, label, func))
+
+    def render(self):
+        lines = []
+        for family in self._families:
+            lines.extend(family.render())
+        for name, help, kind, label, func in self._collectors:
+            try:
+                value = func()
+            except Exception:
+                logger.exception('Ошибка коллектора метрики %s', name)
+                continue
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            if isinstance(value, dict):
+                for label_value, number in sorted(value.items()):
+                    lines.append(f'{name}{_labels(label, label_value)} {number}')
+            else:
+                lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HANDLER_LATENCY = REGISTRY.histogram(
+    'timerbot_handler_seconds',
+    'Время обработки команды или нажатия кнопки',
+    label='handler',
+)
+FIRE_DELAY = REGISTRY.histogram(
+    'timerbot_fire_delay_seconds',
+    'Задержка срабатывания записи таймера относительно ее срока',
+    buckets=DELAY_BUCKETS,
+).labels()
+IGNORED_CALLBACKS = REGISTRY.counter(
+    'timerbot_ignored_callbacks_total',
+    'Нажатия кнопок без действия',
+).labels()
+
+
+def timed(handler_name):
+    """Декоратор: пишет время работы асинхронного обработчика в HANDLER_LATENCY."""
+    histogram = HANDLER_LATENCY.labels(handler_name)
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+class SamplingProfiler:
+    """
+    Семплирующий профайлер потока event loop.
+
+    Фоновый поток раз в interval секунд снимает стек целевого потока и
+    копит счетчики свернутых стеков (формат folded для flamegraph).
+    Пока профайлер выключен, он ничего не стоит.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = _StackCounter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.samples.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает сбор и возвращает свернутые стеки."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.folded()
+
+    def folded(self):
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.samples.most_common()
+        )
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_filename}:{code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+
+async def serve(host, port, registry=REGISTRY):
+    """
+    Запускает HTTP-эндпоинт: /metrics — метрики, /profile/start и
+    /profile/stop — включение профайлера и выгрузка стеков.
+    """
+    profiler = SamplingProfiler()
+
+    async def handle(reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            path = parts[1].split('?', 1)[0] if len(parts) > 1 else ''
+            status = '200 OK'
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            if path == '/metrics':
+                body = registry.render()
+            elif path == '/profile/start':
+                profiler.start()
+                body = 'profiler started\n'
+            elif path == '/profile/stop':
+                body = profiler.stop()
+            else:
+                status, body = '404 Not Found', 'not found\n'
+            payload = body.encode()
+            writer.write(
+                f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+                f'Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n'.encode()
+                + payload
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info('Метрики доступны на http://%s:%d/metrics', host, port)
+    return server
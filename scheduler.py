@@ -0,0 +1,148 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Виды записей в очереди
+KIND_TIMER = 0
+KIND_REMINDER = 1
+
+
+class TimerEntry:
+    """Запись таймера в очереди планировщика."""
+
+    __slots__ = ('due', 'chat_id', 'message_id', 'kind')
+
+    def __init__(self, due, chat_id, message_id, kind=KIND_TIMER):
+        self.due = due  # Абсолютное время срабатывания (unix time)
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.kind = kind
+
+    def __repr__(self):
+        return (
+            f'TimerEntry(due={self.due!r}, chat_id={self.chat_id!r}, '
+            f'message_id={self.message_id!r}, kind={self.kind!r})'
+        )
+
+
+class TimerScheduler:
+    """
+    Единый планировщик таймеров на event loop приложения.
+
+    Хранит записи в min-куче по абсолютному времени срабатывания, спит
+    только до ближайшего дедлайна и отдает наступившие таймеры пачками
+    в корутину on_fire(entries).
+    """
+
+    def __init__(self, on_fire, batch_size=1000, clock=time.time):
+        self._on_fire = on_fire
+        self._batch_size = batch_size
+        self._clock = clock
+        self._heap = []
+        self._seq = itertools.count()  # Разрешает равенство due без сравнения записей
+        self._cancelled = {}  # (chat_id, message_id) отмененного таймера -> его срок
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def next_deadline(self):
+        """Время ближайшего срабатывания или None, если очередь пуста."""
+        return self._heap[0][0] if self._heap else None
+
+    def schedule(self, entry):
+        """Добавляет запись в очередь, будя планировщик при новом минимуме."""
+        heapq.heappush(self._heap, (entry.due, next(self._seq), entry))
+        if self._heap[0][2] is entry:
+            self._wakeup.set()
+
+    def schedule_many(self, entries):
+        """Добавляет пачку записей за одну перестройку кучи."""
+        heap = self._heap
+        seq = self._seq
+        heap.extend((entry.due, next(seq), entry) for entry in entries)
+        heapq.heapify(heap)
+        self._wakeup.set()
+
+    def cancel(self, chat_id, message_id, due):
+        """
+        Отменяет таймер со сроком due вместе с напоминаниями. Записи
+        остаются в куче и отбрасываются при извлечении; отметка снимается
+        вместе с основной записью, которая срабатывает последней, или в
+        prune_cancelled, если основной записи в куче нет.
+        """
+        self._cancelled[(chat_id, message_id)] = due
+
+    def prune_cancelled(self):
+        """
+        Снимает отметки отмены, которым больше нечего отбрасывать: все
+        записи таймера не позже его срока, и если куча начинается позже,
+        их в памяти уже нет. Нужно для таймеров, основная запись которых
+        была отменена, пока лежала только на диске.
+        """
+        cancelled = self._cancelled
+        if not cancelled:
+            return
+        head = self._heap[0][0] if self._heap else float('inf')
+        for key in [key for key, due in cancelled.items() if due < head]:
+            del cancelled[key]
+
+    def pop_due(self, now):
+        """Извлекает до batch_size записей, время которых наступило."""
+        heap = self._heap
+        cancelled = self._cancelled
+        batch = []
+        while heap and heap[0][0] <= now and len(batch) < self._batch_size:
+            entry = heapq.heappop(heap)[2]
+            if cancelled:
+                key = (entry.chat_id, entry.message_id)
+                if key in cancelled:
+                    if entry.kind == KIND_TIMER:
+                        del cancelled[key]
+                    continue
+            batch.append(entry)
+        return batch
+
+    def start(self):
+        """Запускает корутину планировщика на текущем event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        """Останавливает корутину планировщика."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run(self):
+        """Основной цикл: ждет ближайший дедлайн и срабатывает пачками."""
+        while True:
+            self._wakeup.clear()
+            now = self._clock()
+            batch = self.pop_due(now)
+            if batch:
+                try:
+                    await self._on_fire(batch)
+                except Exception:
+                    logger.exception('Ошибка при обработке сработавших таймеров')
+                continue
+
+            timeout = None
+            if self._heap:
+                timeout = self._heap[0][0] - now
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import time
+
+from chat_index import ChatIndex
+from dispatcher import OutboundDispatcher
+from metrics import FIRE_DELAY
+from scheduler import KIND_REMINDER, KIND_TIMER, TimerScheduler
+
+logger = logging.getLogger(__name__)
+
+
+def fire_timers(dispatcher, entries):
+    """
+    Ставит сообщения сработавших записей в очередь отправки. Запись
+    возвращается в on_done диспетчера, когда ее сообщение отправлено.
+    """
+    for entry in entries:
+        if entry.kind == KIND_REMINDER:
+            dispatcher.send_message(
+                entry.chat_id, "Напоминание: событие приближается!", token=entry
+            )
+        else:
+            dispatcher.edit_message_text(
+                entry.chat_id, entry.message_id,
+                "Таймер завершен! Время события истекло!", token=entry
+            )
+
+
+class TimerService:
+    """
+    Таймеры одного процесса: хранилище, планировщик и очередь отправки.
+
+    Обработчики бота работают только через add, cancel и page, поэтому
+    вместо сервиса можно подставить ShardRouter с тем же интерфейсом.
+    Страницы таймеров чата и отмена обслуживаются из ChatIndex — кэша
+    не более max_chats недавно активных чатов. Промах читает таймеры
+    чата из хранилища по индексу (chat_id, kind, due) вместе с еще не
+    записанным журналом, не сбрасывая его.
+
+    В планировщике держатся только записи со сроком до loaded_until,
+    который фоновая задача раз в horizon / 4 секунд сдвигает на now +
+    horizon, подгружая следующее окно из индекса хранилища по due.
+    Более дальние записи лежат только на диске. horizon=0 держит в
+    памяти все записи.
+    """
+
+    def __init__(self, bot, store, send_rate=30, horizon=3600, drain_timeout=5.0,
+                 max_chats=10000):
+        self.store = store
+        self.chats = ChatIndex(max_chats)
+        # Срабатывание записывается в хранилище только после отправки
+        # сообщения, чтобы очередь, не отправленная до остановки, не терялась
+        self.dispatcher = OutboundDispatcher(bot, rate=send_rate, on_done=store.fired)
+        self.scheduler = TimerScheduler(self._on_fire)
+        self.drain_timeout = drain_timeout
+        self.horizon = horizon or float('inf')
+        self.loaded_until = float('-inf')  # Записи не позже этого срока уже в планировщике
+        self._paging = None  # Записи, добавленные за время чтения окна с диска
+        self._paging_until = None
+        self._task = None
+
+    async def _on_fire(self, entries):
+        now = time.time()
+        for entry in entries:
+            FIRE_DELAY.observe(now - entry.due)
+        fire_timers(self.dispatcher, entries)
+
+    def add(self, entries):
+        """
+        Сохраняет таймер вместе с напоминаниями и ставит в очередь те
+        записи, что попадают в загруженное окно.
+        """
+        self.store.add(entries)
+        schedule = self.scheduler.schedule
+        for entry in entries:
+            if entry.kind == KIND_TIMER:
+                self.chats.add(entry.chat_id, entry.message_id, entry.due)
+            if entry.due <= self.loaded_until:
+                schedule(entry)
+            elif self._paging is not None and entry.due <= self._paging_until:
+                self._paging.append(entry)
+
+    async def cancel(self, chat_id, message_id):
+        """
+        Отменяет таймер и его напоминания; возвращает False, если таймера
+        нет или его срок уже наступил.
+        """
+        await self._load_chat(chat_id)
+        due = self.chats.get(chat_id, message_id)
+        # Сработавший таймер остается в хранилище, пока сообщение не ушло;
+        # его отмена переписала бы «Таймер завершен!» и оставила бы
+        # отметку, которую некому снять
+        if due is None or due <= time.time():
+            return False
+        self.chats.remove(chat_id, message_id)
+        self.scheduler.cancel(chat_id, message_id, due)
+        self.store.cancel(chat_id, message_id)
+        return True
+
+    async def _load_chat(self, chat_id):
+        if chat_id not in self.chats:
+            self.chats.load(chat_id, await self.store.load_chat(chat_id, time.time()))
+
+    async def page_in(self, now=None):
+        """Подгружает в планировщик записи со сроком до now + horizon."""
+        until = (time.time() if now is None else now) + self.horizon
+        if until <= self.loaded_until:
+            return 0
+        # Пока окно читается с диска, новые записи из него копятся в
+        # _paging: в прочитанное они могут не попасть
+        self._paging = []
+        self._paging_until = until
+        try:
+            # Сбрасываем журнал, чтобы прочитать и свежие записи, и отмены
+            await self.store.flush()
+            entries = await self.store.load_window(self.loaded_until, until)
+            added = self._paging
+        finally:
+            self._paging = self._paging_until = None
+        if added:
+            keys = {(e.chat_id, e.message_id, e.kind, e.due) for e in added}
+            entries = [
+                e for e in entries if (e.chat_id, e.message_id, e.kind, e.due) not in keys
+            ]
+            entries.extend(added)
+        if entries:
+            self.scheduler.schedule_many(entries)
+        self.loaded_until = until
+        self.scheduler.prune_cancelled()
+        return len(entries)
+
+    async def _run_paging(self):
+        while True:
+            await asyncio.sleep(self.horizon / 4)
+            try:
+                await self.page_in()
+            except Exception:
+                logger.exception('Ошибка подгрузки таймеров из хранилища')
+
+    async def page(self, chat_id, offset, limit):
+        """Страница ожидающих таймеров чата и их общее число."""
+        await self._load_chat(chat_id)
+        return self.chats.page(chat_id, offset, limit, time.time())
+
+    def register_metrics(self, registry):
+        """Добавляет в реестр метрик состояние планировщика, хранилища и отправки."""
+        scheduler = self.scheduler
+        dispatcher = self.dispatcher
+
+        def next_deadline():
+            deadline = scheduler.next_deadline
+            return 0 if deadline is None else deadline - time.time()
+
+        registry.collector(
+            'timerbot_scheduler_pending', 'Записей в очереди планировщика',
+            lambda: len(scheduler)
+        )
+        registry.collector(
+            'timerbot_scheduler_next_deadline_seconds',
+            'Секунд до ближайшего срабатывания (отрицательно при опоздании)',
+            next_deadline
+        )
+        registry.collector(
+            'timerbot_scheduler_loaded_ahead_seconds',
+            'На сколько секунд вперед записи загружены в планировщик',
+            lambda: self.loaded_until - time.time()
+        )
+        registry.collector(
+            'timerbot_store_journal', 'Событий в журнале, ожидающих записи на диск',
+            lambda: len(self.store)
+        )
+        registry.collector(
+            'timerbot_outbound_queue', 'Сообщений в очереди отправки',
+            lambda: len(dispatcher)
+        )
+        registry.collector(
+            'timerbot_outbound_total', 'Итоги отправки сообщений по результату',
+            lambda: {
+                'sent': dispatcher.sent,
+                'merged': dispatcher.merged,
+                'retry_after': dispatcher.retry_after,
+                'failed': dispatcher.failed,
+            },
+            kind='counter', label='result'
+        )
+
+    async def start(self):
+        """Загружает из хранилища текущее окно записей и запускает фоновые задачи."""
+        await self.store.open()
+        loaded = await self.page_in()
+        logger.info("Загружено записей из хранилища: %d", loaded)
+        self.dispatcher.start()
+        self.store.start()
+        self.scheduler.start()
+        if self.horizon != float('inf'):
+            self._task = asyncio.get_running_loop().create_task(self._run_paging())
+
+    async def stop(self):
+        """
+        Останавливает планировщик и отправку, затем сбрасывает журнал на
+        диск.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.scheduler.stop()
+        # Даем очереди отправки немного дойти; неотправленное остается в
+        # хранилище несработавшим и уйдет после перезапуска
+        try:
+            await asyncio.wait_for(self.dispatcher.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.info("Не отправлено до остановки сообщений: %d", len(self.dispatcher))
+        await self.dispatcher.stop()
+        await self.store.close()
@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+
+class Session:
+    """Состояние диалога выбора даты, времени и подтверждения одного пользователя."""
+
+    __slots__ = ('target_date', 'waiting_for_time_confirmation', 'expires')
+
+    def __init__(self, expires):
+        self.target_date = None
+        self.waiting_for_time_confirmation = False
+        self.expires = expires
+
+
+class SessionStore:
+    """
+    Хранилище сессий с вытеснением неактивных по TTL.
+
+    Сроки жизни раскладываются по слотам колеса шириной resolution
+    секунд. Продление сессии лишь добавляет ее в более поздний слот,
+    а фоновая очистка просматривает прошедшие слоты и удаляет сессии,
+    срок которых действительно истек.
+    """
+
+    def __init__(self, ttl=900, resolution=None, clock=time.monotonic):
+        self.ttl = ttl
+        # Не больше ~64 слотов на TTL, чтобы продления не плодили записи
+        self.resolution = resolution or max(1.0, ttl / 64)
+        self._clock = clock
+        self._sessions = {}
+        self._wheel = {}  # номер слота -> список user_id
+        self._cursor = self._slot(clock())
+        self._task = None
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _slot(self, moment):
+        return int(moment // self.resolution)
+
+    def get(self, user_id):
+        """Возвращает живую сессию пользователя, продлевая ее, или None."""
+        session = self._sessions.get(user_id)
+        if session is None:
+            return None
+        now = self._clock()
+        if session.expires <= now:
+            del self._sessions[user_id]
+            self.evicted += 1
+            return None
+        self._touch(user_id, session, now)
+        return session
+
+    def open(self, user_id):
+        """Возвращает сессию пользователя, создавая новую при необходимости."""
+        session = self.get(user_id)
+        if session is None:
+            now = self._clock()
+            session = self._sessions[user_id] = Session(now + self.ttl)
+            self._wheel.setdefault(self._slot(session.expires), []).append(user_id)
+        return session
+
+    def discard(self, user_id):
+        """Завершает сессию пользователя."""
+        self._sessions.pop(user_id, None)
+
+    def _touch(self, user_id, session, now):
+        expires = now + self.ttl
+        slot = self._slot(expires)
+        if slot != self._slot(session.expires):
+            self._wheel.setdefault(slot, []).append(user_id)
+        session.expires = expires
+
+    def sweep(self, now=None):
+        """Удаляет сессии из прошедших слотов колеса, срок которых истек."""
+        if now is None:
+            now = self._clock()
+        current = self._slot(now)
+        sessions = self._sessions
+        evicted = 0
+        for slot in range(self._cursor, current):
+            for user_id in self._wheel.pop(slot, ()):
+                session = sessions.get(user_id)
+                if session is not None and session.expires <= now:
+                    del sessions[user_id]
+                    evicted += 1
+        self._cursor = max(self._cursor, current)
+        self.evicted += evicted
+        return evicted
+
+    def start(self):
+        """Запускает периодическую очистку на текущем event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        """Останавливает периодическую очистку."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.resolution)
+            self.sweep()
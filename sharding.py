@@ -0,0 +1,276 @@
+"""
+Шардирование таймеров по chat_id между процессами-воркерами.
+
+Основной процесс принимает обновления и через ShardRouter отправляет
+операции с таймерами в очередь воркера, выбранного по хэшу chat_id.
+Каждый воркер держит собственные хранилище, планировщик и очередь
+отправки. Отмена и страница списка возвращают ответ через общую
+очередь ответов. Связь идет через multiprocessing.Queue, внешний
+брокер не нужен.
+"""
+import asyncio
+import glob
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+
+from telegram import Bot
+
+import metrics
+from scheduler import TimerEntry
+from service import TimerService
+from storage import SqliteTimerStore, connect
+
+logger = logging.getLogger(__name__)
+
+# Команды воркеру
+CMD_ADD = 'add'
+CMD_CANCEL = 'cancel'
+CMD_PAGE = 'page'
+CMD_STOP = 'stop'
+
+# Сколько ждать ответа шарда, секунд
+REPLY_TIMEOUT = 10
+
+_MASK = (1 << 64) - 1
+
+
+def shard_for(chat_id, shards):
+    """Номер шарда для чата: мультипликативный хэш chat_id."""
+    return ((chat_id * 0x9E3779B97F4A7C15) & _MASK) % shards
+
+
+def shard_db_path(path, index):
+    """Путь к базе таймеров шарда: timers.db -> timers.shard0.db."""
+    root, ext = os.path.splitext(path)
+    return f'{root}.shard{index}{ext}'
+
+
+def _shard_files(db_path):
+    """Существующие файлы шардов базы db_path: {номер шарда: путь}."""
+    root, ext = os.path.splitext(db_path)
+    prefix = f'{root}.shard'
+    files = {}
+    for path in glob.glob(glob.escape(prefix) + '*' + glob.escape(ext)):
+        number = path[len(prefix):len(path) - len(ext)]
+        if number.isdigit():
+            files[int(number)] = path
+    return files
+
+
+def _move_rows(conn, targets, shards, keep=None):
+    """Переносит строки базы conn в файлы targets по шарду чата, кроме шарда keep."""
+    conn.create_function(
+        'shard_for', 1, lambda chat_id: shard_for(chat_id, shards) if shards else 0,
+        deterministic=True
+    )
+    moved = 0
+    for index, target in enumerate(targets):
+        if index == keep:
+            continue
+        conn.execute('ATTACH DATABASE ? AS target', (target,))
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO target.timers (chat_id, message_id, kind, due)'
+                    ' SELECT chat_id, message_id, kind, due FROM main.timers'
+                    ' WHERE shard_for(chat_id) = ?', (index,)
+                )
+                moved += conn.execute(
+                    'DELETE FROM main.timers WHERE shard_for(chat_id) = ?', (index,)
+                ).rowcount
+        finally:
+            conn.execute('DETACH DATABASE target')
+    return moved
+
+
+def rebalance(db_path, shards):
+    """
+    Раскладывает сохраненные таймеры по файлам под текущее число шардов.
+
+    При shards > 0 строки из db_path, из файлов шардов с номером не
+    меньше shards и из файлов, разложенных под другое число шардов,
+    переносятся в файл шарда своего чата. При shards = 0 все таймеры
+    собираются в db_path. Число шардов, под которое разложен файл,
+    хранится в PRAGMA user_version, поэтому согласованные файлы не
+    перечитываются. Возвращает число перенесенных строк.
+    """
+    if shards > 0:
+        targets = [shard_db_path(db_path, index) for index in range(shards)]
+    else:
+        targets = [db_path]
+    for target in targets:
+        created = not os.path.exists(target)
+        conn = connect(target)
+        if created:
+            conn.execute(f'PRAGMA user_version = {shards}')
+        conn.close()
+
+    sources = sorted(_shard_files(db_path).items())
+    if shards > 0:
+        sources.append((None, db_path))
+    moved = 0
+    for index, path in sources:
+        if not os.path.exists(path):
+            continue
+        conn = connect(path)
+        try:
+            if index is not None and index < shards:
+                if conn.execute('PRAGMA user_version').fetchone()[0] == shards:
+                    continue
+                moved += _move_rows(conn, targets, shards, keep=index)
+                conn.execute(f'PRAGMA user_version = {shards}')
+            elif conn.execute('SELECT EXISTS (SELECT 1 FROM timers)').fetchone()[0]:
+                moved += _move_rows(conn, targets, shards)
+        finally:
+            conn.close()
+    return moved
+
+
+def _drain(commands, limit=1000):
+    """Блокирующе ждет первую команду и забирает все уже пришедшие."""
+    batch = [commands.get()]
+    try:
+        while len(batch) < limit:
+            batch.append(commands.get_nowait())
+    except queue.Empty:
+        pass
+    return batch
+
+
+async def _serve(index, token, base_url, db_path, send_rate, horizon, metrics_port,
+                 commands, replies):
+    kwargs = {'base_url': base_url} if base_url else {}
+    async with Bot(token, **kwargs) as bot:
+        service = TimerService(
+            bot, SqliteTimerStore(db_path), send_rate=send_rate, horizon=horizon
+        )
+        await service.start()
+        if metrics_port:
+            service.register_metrics(metrics.REGISTRY)
+            await metrics.serve(metrics_port[0], metrics_port[1])
+        loop = asyncio.get_running_loop()
+        logger.info("Шард %d запущен", index)
+        try:
+            while True:
+                batch = await loop.run_in_executor(None, _drain, commands)
+                for command in batch:
+                    if command[0] == CMD_ADD:
+                        service.add([TimerEntry(*row) for row in command[1]])
+                    elif command[0] == CMD_CANCEL:
+                        replies.put((command[1], await service.cancel(*command[2:])))
+                    elif command[0] == CMD_PAGE:
+                        replies.put((command[1], await service.page(*command[2:])))
+                    else:
+                        return
+        finally:
+            await service.stop()
+            logger.info("Шард %d остановлен", index)
+
+
+def run_shard(index, token, base_url, db_path, send_rate, horizon, metrics_port,
+              commands, replies):
+    """Точка входа процесса-воркера."""
+    # Ctrl+C получает вся группа процессов; шард останавливает основной процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    asyncio.run(_serve(
+        index, token, base_url, db_path, send_rate, horizon, metrics_port,
+        commands, replies
+    ))
+
+
+class ShardRouter:
+    """Распределяет операции с таймерами по процессам-шардам."""
+
+    def __init__(self, shards, token, db_path, base_url=None, send_rate=30,
+                 metrics_address=None, horizon=3600):
+        self.shards = shards
+        self._context = multiprocessing.get_context('spawn')
+        self._queues = [self._context.Queue() for _ in range(shards)]
+        self._replies = self._context.Queue()
+        # Лимит Telegram общий для бота, поэтому делим его между шардами.
+        # Шард i отдает метрики на порту основного процесса + 1 + i.
+        self._args = [
+            (index, token, base_url, shard_db_path(db_path, index),
+             send_rate / shards, horizon,
+             (metrics_address[0], metrics_address[1] + 1 + index) if metrics_address else None,
+             self._queues[index], self._replies)
+            for index in range(shards)
+        ]
+        self._processes = []
+        self._request_ids = itertools.count()
+        self._waiters = {}  # номер запроса -> future ответа
+        self._reader = None
+
+    def add(self, entries):
+        """Отправляет записи таймера в шард его чата."""
+        rows = [(e.due, e.chat_id, e.message_id, e.kind) for e in entries]
+        self._queues[shard_for(entries[0].chat_id, self.shards)].put((CMD_ADD, rows))
+
+    async def cancel(self, chat_id, message_id):
+        """Отменяет таймер в шарде его чата; False, если таймера нет."""
+        return await self._request(CMD_CANCEL, chat_id, message_id)
+
+    async def page(self, chat_id, offset, limit):
+        """Страница ожидающих таймеров чата и их общее число."""
+        return await self._request(CMD_PAGE, chat_id, offset, limit)
+
+    async def _request(self, command, chat_id, *args):
+        request_id = next(self._request_ids)
+        future = self._waiters[request_id] = asyncio.get_running_loop().create_future()
+        self._queues[shard_for(chat_id, self.shards)].put(
+            (command, request_id, chat_id) + args
+        )
+        try:
+            return await asyncio.wait_for(future, REPLY_TIMEOUT)
+        finally:
+            self._waiters.pop(request_id, None)
+
+    async def _read_replies(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            reply = await loop.run_in_executor(None, self._replies.get)
+            if reply is None:
+                return
+            request_id, result = reply
+            future = self._waiters.get(request_id)
+            if future is not None and not future.done():
+                future.set_result(result)
+
+    def register_metrics(self, registry):
+        """Добавляет в реестр метрик число живых шардов."""
+        registry.collector(
+            'timerbot_shards_alive', 'Работающих процессов-шардов',
+            lambda: sum(process.is_alive() for process in self._processes)
+        )
+
+    async def start(self):
+        """Запускает процессы-шарды и чтение их ответов."""
+        self._reader = asyncio.get_running_loop().create_task(self._read_replies())
+        for args in self._args:
+            process = self._context.Process(
+                target=run_shard, args=args, name=f'timer-shard-{args[0]}', daemon=True
+            )
+            process.start()
+            self._processes.append(process)
+
+    async def stop(self, timeout=10):
+        """Останавливает шарды, давая им сбросить журналы на диск."""
+        for commands in self._queues:
+            commands.put((CMD_STOP,))
+        for process in self._processes:
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        if self._reader is not None:
+            self._replies.put(None)
+            await self._reader
+            self._reader = None
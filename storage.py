@@ -0,0 +1,261 @@
+import abc
+import asyncio
+import logging
+import sqlite3
+
+from scheduler import KIND_TIMER, TimerEntry
+
+logger = logging.getLogger(__name__)
+
+# Операции журнала записи
+OP_ADD = 0
+OP_CANCEL = 1
+OP_FIRED = 2
+
+
+class TimerStore(abc.ABC):
+    """
+    Базовый класс постоянного хранилища таймеров.
+
+    События создания, отмены и срабатывания копятся в журнале в памяти
+    и сбрасываются на диск пачками: одна транзакция на пачку вместо
+    fsync на каждый таймер. Наследники реализуют _open, _write_batch,
+    _read_window, _read_chat и _close.
+    """
+
+    def __init__(self, flush_interval=0.2, max_batch=5000, retry_interval=1.0):
+        self._flush_interval = flush_interval
+        self._retry_interval = retry_interval
+        self._max_batch = max_batch
+        self._journal = []
+        self._dirty = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._closing = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._journal)
+
+    def add(self, entries):
+        """Записывает в журнал создание таймера и его напоминаний."""
+        self._journal.extend((OP_ADD, entry) for entry in entries)
+        self._mark_dirty()
+
+    def cancel(self, chat_id, message_id):
+        """Записывает в журнал отмену таймера вместе с напоминаниями."""
+        self._journal.append((OP_CANCEL, (chat_id, message_id)))
+        self._mark_dirty()
+
+    def fired(self, entries):
+        """Записывает в журнал срабатывание пачки записей."""
+        self._journal.extend((OP_FIRED, entry) for entry in entries)
+        self._mark_dirty()
+
+    def _mark_dirty(self):
+        self._dirty.set()
+
+    async def open(self):
+        """Открывает хранилище."""
+        await asyncio.to_thread(self._open)
+
+    async def load_window(self, after, until, batch_size=10000):
+        """
+        Возвращает незавершенные записи со сроком в (after, until],
+        упорядоченные по времени срабатывания. Читает пачками по индексу
+        due, не блокируя event loop.
+        """
+        entries = []
+        for rows in await asyncio.to_thread(self._read_window, after, until, batch_size):
+            entries.extend(TimerEntry(*row) for row in rows)
+        return entries
+
+    async def flush(self):
+        """
+        Сбрасывает накопленный журнал одной транзакцией. Если запись не
+        удалась, пачка возвращается в начало журнала и уйдет со следующей:
+        операции журнала идемпотентны, поэтому повтор уже записанной
+        пачки безопасен.
+        """
+        async with self._flush_lock:
+            if not self._journal:
+                return
+            journal, self._journal = self._journal, []
+            try:
+                await asyncio.to_thread(self._write_batch, journal)
+            except BaseException:
+                self._journal[:0] = journal
+                raise
+
+    def start(self):
+        """Запускает фоновый групповой коммит журнала."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    async def close(self):
+        """
+        Останавливает фоновую запись, сбрасывает остаток и закрывает
+        хранилище. Запись, уже идущая в потоке, дожидается завершения:
+        отмена to_thread не останавливает поток, и закрытое под ним
+        соединение откатило бы пачку.
+        """
+        if self._task is not None:
+            self._closing.set()
+            self._dirty.set()
+            await self._task
+            self._task = None
+        try:
+            await self.flush()
+        finally:
+            await asyncio.to_thread(self._close)
+
+    async def _run(self):
+        closing = self._closing
+        while not closing.is_set():
+            await self._dirty.wait()
+            # Даем журналу накопиться, если он еще не достиг размера пачки;
+            # close прерывает паузу
+            if len(self._journal) < self._max_batch and not closing.is_set():
+                try:
+                    await asyncio.wait_for(closing.wait(), self._flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._dirty.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception('Ошибка записи журнала таймеров')
+                # Пачка осталась в журнале: повторяем после паузы
+                self._dirty.set()
+                try:
+                    await asyncio.wait_for(closing.wait(), self._retry_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    @abc.abstractmethod
+    def _open(self):
+        pass
+
+    @abc.abstractmethod
+    def _write_batch(self, journal):
+        pass
+
+    @abc.abstractmethod
+    def _read_window(self, after, until, batch_size):
+        pass
+
+    async def load_chat(self, chat_id, now):
+        """
+        Возвращает таймеры чата [(due, message_id)] со сроком позже now,
+        упорядоченные по сроку, с учетом еще не записанного журнала.
+        Журнал не сбрасывается: чтение идет под блокировкой записи, поэтому
+        на диске ровно то, что было до журнала.
+        """
+        async with self._flush_lock:
+            rows = await asyncio.to_thread(self._read_chat, chat_id, now)
+            dues = {message_id: due for due, message_id in rows}
+            for op, item in self._journal:
+                if op == OP_CANCEL:
+                    if item[0] == chat_id:
+                        dues.pop(item[1], None)
+                elif item.chat_id != chat_id or item.kind != KIND_TIMER:
+                    continue
+                elif op == OP_ADD:
+                    dues[item.message_id] = item.due
+                elif dues.get(item.message_id) == item.due:
+                    del dues[item.message_id]
+        return sorted((due, message_id) for message_id, due in dues.items() if due > now)
+
+    @abc.abstractmethod
+    def _read_chat(self, chat_id, now):
+        pass
+
+    @abc.abstractmethod
+    def _close(self):
+        pass
+
+
+def connect(path):
+    """Открывает базу таймеров в режиме WAL, создавая таблицу и индексы."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS timers ('
+        ' chat_id INTEGER NOT NULL,'
+        ' message_id INTEGER NOT NULL,'
+        ' kind INTEGER NOT NULL,'
+        ' due REAL NOT NULL,'
+        ' PRIMARY KEY (chat_id, message_id, kind, due)'
+        ')'
+    )
+    conn.execute('CREATE INDEX IF NOT EXISTS timers_due ON timers (due)')
+    conn.execute('CREATE INDEX IF NOT EXISTS timers_chat ON timers (chat_id, kind, due)')
+    conn.commit()
+    return conn
+
+
+class SqliteTimerStore(TimerStore):
+    """Хранилище таймеров в SQLite в режиме WAL с индексом по времени срабатывания."""
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._conn = None
+
+    def _open(self):
+        self._conn = connect(self.path)
+
+    def _write_batch(self, journal):
+        conn = self._conn
+        with conn:
+            # Подряд идущие операции одного типа пишем одним executemany
+            start = 0
+            while start < len(journal):
+                op = journal[start][0]
+                end = start
+                while end < len(journal) and journal[end][0] == op:
+                    end += 1
+                chunk = journal[start:end]
+                if op == OP_ADD:
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO timers (chat_id, message_id, kind, due)'
+                        ' VALUES (?, ?, ?, ?)',
+                        [(e.chat_id, e.message_id, e.kind, e.due) for _, e in chunk]
+                    )
+                elif op == OP_CANCEL:
+                    conn.executemany(
+                        'DELETE FROM timers WHERE chat_id = ? AND message_id = ?',
+                        [key for _, key in chunk]
+                    )
+                else:
+                    conn.executemany(
+                        'DELETE FROM timers WHERE chat_id = ? AND message_id = ?'
+                        ' AND kind = ? AND due = ?',
+                        [(e.chat_id, e.message_id, e.kind, e.due) for _, e in chunk]
+                    )
+                start = end
+
+    def _read_window(self, after, until, batch_size):
+        cursor = self._conn.execute(
+            'SELECT due, chat_id, message_id, kind FROM timers'
+            ' WHERE due > ? AND due <= ? ORDER BY due',
+            (after, until)
+        )
+        batches = []
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return batches
+            batches.append(rows)
+
+    def _read_chat(self, chat_id, now):
+        return self._conn.execute(
+            'SELECT due, message_id FROM timers WHERE chat_id = ? AND kind = ? AND due > ?',
+            (chat_id, KIND_TIMER, now)
+        ).fetchall()
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
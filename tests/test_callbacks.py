@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from callbacks import (
+    BACK_DATA, MANUAL_DATA, OP_BACK, OP_CANCEL, OP_CANCEL_PAGE, OP_DATE, OP_LIST,
+    OP_MANUAL, OP_MONTH, OP_TIME, CallbackRouter, cancel_data, cancel_page_data,
+    date_data, decode, list_data, month_data, time_data
+)
+import timerbot
+
+
+@pytest.mark.parametrize('data, expected', [
+    (month_data(2026, 10), (OP_MONTH, (2026, 10))),
+    (month_data(2026, 1), (OP_MONTH, (2026, 1))),
+    (month_data(2026, 12), (OP_MONTH, (2026, 12))),
+    (date_data(2026, 10, 18), (OP_DATE, (datetime(2026, 10, 18),))),
+    (date_data(2024, 2, 29), (OP_DATE, (datetime(2024, 2, 29),))),
+    (time_data(0, 0), (OP_TIME, (0, 0))),
+    (time_data(23, 59), (OP_TIME, (23, 59))),
+    (list_data(0), (OP_LIST, (0,))),
+    (cancel_page_data(30), (OP_CANCEL_PAGE, (30,))),
+    (cancel_data(2 ** 31 - 1, 120), (OP_CANCEL, (2 ** 31 - 1, 120))),
+    (MANUAL_DATA, (OP_MANUAL, ())),
+    (BACK_DATA, (OP_BACK, ())),
+])
+def test_round_trip(data, expected):
+    assert len(data.encode()) <= 64
+    assert decode(data) == expected
+
+
+@pytest.mark.parametrize('data, expected', [
+    ('prev_month-2026-1', (OP_MONTH, (2025, 12))),
+    ('next_month-2026-12', (OP_MONTH, (2027, 1))),
+    ('date_2026-10-18', (OP_DATE, (datetime(2026, 10, 18),))),
+    ('time_09:30', (OP_TIME, (9, 30))),
+    ('time_manual', (OP_MANUAL, ())),
+    ('back', (OP_BACK, ())),
+])
+def test_legacy(data, expected):
+    assert decode(data) == expected
+
+
+@pytest.mark.parametrize('data', ['1q', 'unknown'])
+def test_unknown(data):
+    assert decode(data) is None
+
+
+@pytest.mark.parametrize('data', [
+    '1dzzzzzzzzzz',  # Порядковый номер даты вне диапазона datetime
+    '1d' + 'z' * 40,  # Число больше 2 ** 63
+    '1d0',
+    '1m0',  # Год 0
+    '1t2s0',  # 60:00
+    '1l-5',  # int() принял бы знак
+    '1l 5',
+    '1l1_0',
+    '1l',
+    '1x5',  # Отмене нужны message_id и смещение
+    '1x1.2.3',
+    'time_25:00',
+    'prev_month-1-1',
+])
+def test_forged(data):
+    with pytest.raises((ValueError, OverflowError)):
+        decode(data)
+
+
+def test_dispatch_drops_forged_data():
+    router = CallbackRouter()
+    calls = []
+
+    @router.route(OP_TIME)
+    async def select_time(update, context, hour, minute):
+        calls.append((hour, minute))
+
+    def update(data):
+        return SimpleNamespace(callback_query=SimpleNamespace(data=data))
+
+    asyncio.run(router.dispatch(update('1t2s0'), None))
+    asyncio.run(router.dispatch(update('1dzzzzzzzzzz'), None))
+    asyncio.run(router.dispatch(update(time_data(9, 30)), None))
+    assert calls == [(9, 30)]
+
+
+def test_back_edits_callback_message():
+    edits = []
+
+    async def edit_text(text, reply_markup=None):
+        edits.append((text, reply_markup))
+
+    # У нажатия кнопки нет update.message: правим сообщение с кнопкой
+    message = SimpleNamespace(edit_text=edit_text)
+    update = SimpleNamespace(
+        message=None, callback_query=SimpleNamespace(data=BACK_DATA, message=message)
+    )
+    asyncio.run(timerbot.router.dispatch(update, None))
+    today = datetime.now()
+    assert edits == [
+        ('Выберите дату для таймера:', timerbot.calendar_markup(today.year, today.month))
+    ]
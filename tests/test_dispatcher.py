@@ -0,0 +1,153 @@
+import asyncio
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from dispatcher import (
+    MAX_MESSAGE_LENGTH, PRIORITY_REMINDER, PRIORITY_TIMER, OutboundDispatcher
+)
+
+
+class FakeBot:
+    """Записывает вызовы; errors — исключения, которые бросят первые вызовы."""
+
+    def __init__(self, errors=()):
+        self.calls = []
+        self.errors = list(errors)
+
+    async def _call(self, method, chat_id, text):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.calls.append((method, chat_id, text))
+
+    async def send_message(self, chat_id, text):
+        await self._call('send', chat_id, text)
+
+    async def edit_message_text(self, chat_id, message_id, text):
+        await self._call('edit', chat_id, text)
+
+
+def make(bot, **kwargs):
+    done = []
+    kwargs.setdefault('rate', 1e9)
+    kwargs.setdefault('per_chat_interval', 0)
+    dispatcher = OutboundDispatcher(bot, on_done=done.extend, **kwargs)
+    return dispatcher, done
+
+
+async def drain(dispatcher, timeout=5):
+    dispatcher.start()
+    try:
+        await asyncio.wait_for(dispatcher.join(), timeout)
+    finally:
+        await dispatcher.stop()
+
+
+def test_texts_are_merged_into_one_message():
+    async def main():
+        bot = FakeBot()
+        dispatcher, done = make(bot)
+        for token in range(3):
+            dispatcher.send_message(1, f'text {token}', token=token)
+        await drain(dispatcher)
+        assert bot.calls == [('send', 1, 'text 0\n\ntext 1\n\ntext 2')]
+        assert sorted(done) == [0, 1, 2]
+        assert dispatcher.merged == 2
+    asyncio.run(main())
+
+
+def test_merged_text_is_capped():
+    async def main():
+        bot = FakeBot()
+        dispatcher, done = make(bot)
+        for token in range(200):
+            dispatcher.send_message(1, 'Напоминание: до окончания таймера 5 минут.',
+                                    token=token)
+        await drain(dispatcher)
+        assert len(bot.calls) > 1
+        assert all(len(text) <= MAX_MESSAGE_LENGTH for _, _, text in bot.calls)
+        assert sum(text.count('Напоминание') for _, _, text in bot.calls) == 200
+        assert sorted(done) == list(range(200))
+    asyncio.run(main())
+
+
+def test_latest_edit_wins_and_keeps_tokens():
+    async def main():
+        bot = FakeBot()
+        dispatcher, done = make(bot)
+        dispatcher.edit_message_text(1, 10, 'old', token='a')
+        dispatcher.edit_message_text(1, 10, 'new', token='b')
+        await drain(dispatcher)
+        assert bot.calls == [('edit', 1, 'new')]
+        assert sorted(done) == ['a', 'b']
+    asyncio.run(main())
+
+
+def test_timer_edits_go_before_reminders():
+    async def main():
+        bot = FakeBot()
+        dispatcher, _ = make(bot, max_in_flight=1)
+        dispatcher.send_message(1, 'reminder', priority=PRIORITY_REMINDER)
+        dispatcher.send_message(2, 'reminder', priority=PRIORITY_REMINDER)
+        dispatcher.edit_message_text(3, 10, 'timer', priority=PRIORITY_TIMER)
+        await drain(dispatcher)
+        assert bot.calls[0] == ('edit', 3, 'timer')
+    asyncio.run(main())
+
+
+def test_retry_after_does_not_count_as_attempt():
+    async def main():
+        bot = FakeBot([RetryAfter(0.01) for _ in range(7)])
+        dispatcher, done = make(bot, max_attempts=3)
+        dispatcher.send_message(1, 'text', token='a')
+        await drain(dispatcher)
+        assert bot.calls == [('send', 1, 'text')]
+        assert done == ['a']
+        assert dispatcher.retry_after == 7
+        assert dispatcher.failed == 0
+    asyncio.run(main())
+
+
+def test_give_up_keeps_entries_unfired():
+    async def main():
+        bot = FakeBot([NetworkError('down') for _ in range(2)])
+        dispatcher, done = make(bot, max_attempts=2)
+        dispatcher.send_message(1, 'text', token='a')
+        dispatcher.start()
+        try:
+            for _ in range(200):
+                if dispatcher.failed:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await dispatcher.stop()
+        assert dispatcher.failed == 1
+        assert bot.calls == []
+        assert done == []
+    asyncio.run(main())
+
+
+def test_bad_request_is_done_without_retry():
+    async def main():
+        bot = FakeBot([BadRequest('Message is not modified')])
+        dispatcher, done = make(bot)
+        dispatcher.edit_message_text(1, 10, 'text', token='a')
+        await drain(dispatcher)
+        assert bot.calls == []
+        assert done == ['a']
+        assert dispatcher.failed == 1
+    asyncio.run(main())
+
+
+def test_rate_limit_spaces_requests():
+    async def main():
+        bot = FakeBot()
+        dispatcher, _ = make(bot, rate=100)
+        for chat_id in range(5):
+            dispatcher.send_message(chat_id, 'text')
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await drain(dispatcher)
+        # Всплеск в один токен: остальные четыре ждут по 10 мс
+        assert loop.time() - started >= 0.035
+        assert len(bot.calls) == 5
+    asyncio.run(main())
@@ -0,0 +1,223 @@
+import asyncio
+import time
+
+import pytest
+
+from scheduler import KIND_REMINDER, TimerEntry
+from service import TimerService
+from storage import SqliteTimerStore
+
+HORIZON = 60
+
+
+def run(coroutine_function):
+    """Запускает тест-корутину со службой без фоновых задач."""
+    def wrapper(tmp_path):
+        async def main():
+            service = TimerService(None, SqliteTimerStore(str(tmp_path / 'timers.db')),
+                                   horizon=HORIZON)
+            now = time.time()
+            # То же, что start, но без планировщика и подгрузки по таймеру:
+            # тест сам решает, когда извлекать записи и двигать окно
+            await service.store.open()
+            await service.page_in(now)
+            try:
+                await coroutine_function(service, now)
+            finally:
+                await service.store.close()
+        asyncio.run(main())
+    wrapper.__name__ = coroutine_function.__name__
+    return wrapper
+
+
+def keys(entries):
+    return sorted((e.chat_id, e.message_id, e.kind, e.due) for e in entries)
+
+
+async def stored(service):
+    await service.store.flush()
+    return keys(await service.store.load_window(float('-inf'), float('inf')))
+
+
+@run
+async def test_add_splits_by_horizon(service, now):
+    near = TimerEntry(now + 10, 1, 1)
+    far = TimerEntry(now + 1000, 1, 2)
+    service.add([near])
+    service.add([far])
+    assert len(service.scheduler) == 1
+    assert await stored(service) == keys([near, far])
+
+    await service.page_in(now + 1000 - HORIZON)
+    assert keys(service.scheduler.pop_due(now + 1000)) == keys([near, far])
+
+
+@run
+async def test_add_during_page_in_is_scheduled_once(service, now):
+    on_disk = TimerEntry(now + 100, 1, 1)
+    service.add([on_disk])
+    await service.store.flush()
+
+    # Держим блокировку записи, чтобы новые записи попали в журнал до
+    # того, как page_in его сбросит, и были прочитаны с диска повторно
+    async with service.store._flush_lock:
+        paging = asyncio.ensure_future(service.page_in(now + 50))
+        await asyncio.sleep(0)
+        assert service._paging is not None
+        racing = [TimerEntry(now + 105, 2, 1), TimerEntry(now + 90, 2, 1, KIND_REMINDER)]
+        service.add(racing)
+    assert await paging == 3
+    # Добавленная после чтения запись попадает прямо в кучу
+    late = TimerEntry(now + 107, 3, 1)
+    service.add([late])
+
+    assert keys(service.scheduler.pop_due(now + 200)) == keys([on_disk, late] + racing)
+
+
+@run
+async def test_add_beyond_paging_window_stays_on_disk(service, now):
+    async with service.store._flush_lock:
+        paging = asyncio.ensure_future(service.page_in(now + 50))
+        await asyncio.sleep(0)
+        service.add([TimerEntry(now + 500, 1, 1)])
+    await paging
+    assert len(service.scheduler) == 0
+
+
+@run
+async def test_cancel_during_page_in(service, now):
+    timer = TimerEntry(now + 100, 1, 1)
+    reminder = TimerEntry(now + 95, 1, 1, KIND_REMINDER)
+    kept = TimerEntry(now + 100, 2, 1)
+    service.add([timer, reminder])
+    service.add([kept])
+    await service.store.flush()
+
+    async with service.store._flush_lock:
+        paging = asyncio.ensure_future(service.page_in(now + 50))
+        cancel = asyncio.ensure_future(service.cancel(1, 1))
+        await asyncio.sleep(0)
+    assert await cancel
+    await paging
+
+    assert keys(service.scheduler.pop_due(now + 200)) == keys([kept])
+    service.scheduler.prune_cancelled()
+    assert not service.scheduler._cancelled
+    assert await stored(service) == keys([kept])
+
+
+@run
+async def test_cancel_timer_still_on_disk(service, now):
+    # Основная запись дальше горизонта, напоминание уже в памяти
+    timer = TimerEntry(now + 1000, 1, 1)
+    reminder = TimerEntry(now + 30, 1, 1, KIND_REMINDER)
+    service.add([timer, reminder])
+    assert len(service.scheduler) == 1
+
+    assert await service.cancel(1, 1)
+    assert service.scheduler.pop_due(now + 31) == []
+    # Основная запись не придет в кучу, поэтому отметку снимает prune
+    service.scheduler.prune_cancelled()
+    assert not service.scheduler._cancelled
+    assert await stored(service) == []
+
+    await service.page_in(now + 1000)
+    assert service.scheduler.pop_due(now + 2000) == []
+
+
+@run
+async def test_prune_keeps_marks_while_entries_remain(service, now):
+    service.add([TimerEntry(now + 20, 1, 1), TimerEntry(now + 10, 1, 1, KIND_REMINDER)])
+    assert await service.cancel(1, 1)
+    service.scheduler.prune_cancelled()
+    assert (1, 1) in service.scheduler._cancelled
+    assert service.scheduler.pop_due(now + 30) == []
+    assert not service.scheduler._cancelled
+
+
+@run
+async def test_cancel_unknown_or_fired(service, now):
+    service.add([TimerEntry(now - 1, 1, 1)])
+    assert not await service.cancel(1, 1)
+    assert not await service.cancel(1, 2)
+    assert not service.scheduler._cancelled
+
+
+@run
+async def test_page(service, now):
+    for index in range(25):
+        service.add([
+            TimerEntry(now + 1000 - index, 1, index),
+            TimerEntry(now + 500 - index, 1, index, KIND_REMINDER),
+        ])
+    service.add([TimerEntry(now + 10, 2, 1)])
+    service.add([TimerEntry(now - 10, 1, 99)])  # Уже сработал
+
+    items, total = await service.page(1, 0, 10)
+    assert total == 25
+    assert [message_id for _, message_id in items] == list(range(24, 14, -1))
+    items, total = await service.page(1, 20, 10)
+    assert [message_id for _, message_id in items] == [4, 3, 2, 1, 0]
+
+    assert await service.cancel(1, 0)
+    assert (await service.page(1, 20, 10))[1] == 24
+    assert await service.page(3, 0, 10) == ([], 0)
+
+
+@run
+async def test_page_reads_journal_without_flushing(service, now):
+    service.add([TimerEntry(now + 100, 1, 1), TimerEntry(now + 200, 1, 2)])
+    await service.store.flush()
+    # Журнал чата, еще не записанный на диск, до первого запроса
+    service.store.add([TimerEntry(now + 50, 1, 3)])
+    service.store.cancel(1, 2)
+    service.store.fired([TimerEntry(now + 100, 1, 1)])
+    journal = len(service.store)
+
+    assert await service.page(1, 0, 10) == ([(now + 50, 3)], 1)
+    assert len(service.store) == journal
+
+
+@run
+async def test_add_while_chat_loads(service, now):
+    service.add([TimerEntry(now + 100, 1, 1)])
+    async with service.store._flush_lock:
+        page = asyncio.ensure_future(service.page(1, 0, 10))
+        await asyncio.sleep(0)
+        service.add([TimerEntry(now + 50, 1, 2)])
+    assert await page == ([(now + 50, 2), (now + 100, 1)], 2)
+    service.add([TimerEntry(now + 70, 1, 3)])
+    assert (await service.page(1, 0, 10))[1] == 3
+
+
+@run
+async def test_evicted_chat_is_reloaded(service, now):
+    service.chats.max_chats = 1
+    service.add([TimerEntry(now + 100, 1, 1), TimerEntry(now + 100, 2, 1)])
+    assert (await service.page(1, 0, 10))[1] == 1
+    assert (await service.page(2, 0, 10))[1] == 1
+    assert 1 not in service.chats
+    # Добавление в вытесненный чат видно после повторной загрузки
+    service.add([TimerEntry(now + 200, 1, 2)])
+    assert await service.cancel(1, 1)
+    assert await service.page(1, 0, 10) == ([(now + 200, 2)], 1)
+    assert 2 not in service.chats
+
+
+@pytest.mark.parametrize('horizon', [0, HORIZON])
+def test_start_loads_current_window(tmp_path, horizon):
+    async def main():
+        path = str(tmp_path / 'timers.db')
+        now = time.time()
+        store = SqliteTimerStore(path)
+        await store.open()
+        store.add([TimerEntry(now + 10, 1, 1), TimerEntry(now + 1000, 1, 2)])
+        await store.close()
+
+        service = TimerService(None, SqliteTimerStore(path), horizon=horizon)
+        await service.start()
+        try:
+            return len(service.scheduler)
+        finally:
+            await service.stop()
+    assert asyncio.run(main()) == (2 if horizon == 0 else 1)
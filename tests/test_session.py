@@ -0,0 +1,58 @@
+from session import SessionStore
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_expires_session():
+    clock = Clock()
+    sessions = SessionStore(ttl=60, clock=clock)
+    sessions.open(1).target_date = 'date'
+    clock.now += 59
+    assert sessions.get(1).target_date == 'date'
+    clock.now += 60
+    assert sessions.get(1) is None
+    assert sessions.evicted == 1
+    assert sessions.open(1).target_date is None
+
+
+def test_sweep_evicts_only_expired():
+    clock = Clock()
+    sessions = SessionStore(ttl=60, resolution=1, clock=clock)
+    for user_id in range(100):
+        sessions.open(user_id)
+    clock.now += 30
+    # Продленные сессии переезжают в более поздние слоты колеса
+    for user_id in range(50):
+        sessions.get(user_id)
+    clock.now += 31
+    assert sessions.sweep() == 50
+    assert len(sessions) == 50
+    assert sessions.get(0) is not None
+    assert sessions.get(50) is None
+    clock.now += 61
+    assert sessions.sweep() == 50
+    assert len(sessions) == 0
+    assert sessions.evicted == 100
+    assert not sessions._wheel
+
+
+def test_sweep_skips_renewed_and_discarded():
+    clock = Clock()
+    sessions = SessionStore(ttl=60, resolution=1, clock=clock)
+    sessions.open(1)
+    sessions.open(2)
+    sessions.discard(2)
+    assert sessions.get(2) is None
+    clock.now += 59.5
+    sessions.get(1)
+    clock.now += 1
+    assert sessions.sweep() == 0
+    assert len(sessions) == 1
+    # Повторный проход по тем же слотам ничего не делает
+    assert sessions.sweep() == 0
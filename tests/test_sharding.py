@@ -0,0 +1,65 @@
+from sharding import rebalance, shard_db_path, shard_for
+from storage import connect
+
+CHATS = range(-50, 50)
+
+
+def write(path, rows):
+    conn = connect(path)
+    with conn:
+        conn.executemany(
+            'INSERT INTO timers (chat_id, message_id, kind, due) VALUES (?, ?, ?, ?)', rows
+        )
+    conn.close()
+
+
+def read(path):
+    conn = connect(path)
+    rows = conn.execute('SELECT chat_id, message_id, kind, due FROM timers').fetchall()
+    conn.close()
+    return sorted(rows)
+
+
+def rows_by_shard(db_path, shards):
+    return [read(shard_db_path(db_path, index)) for index in range(shards)]
+
+
+def check_layout(db_path, shards, rows):
+    layout = rows_by_shard(db_path, shards)
+    for index, shard_rows in enumerate(layout):
+        assert all(shard_for(row[0], shards) == index for row in shard_rows)
+    assert sorted(row for shard_rows in layout for row in shard_rows) == rows
+
+
+def test_rebalance_round_trip(tmp_path):
+    db_path = str(tmp_path / 'timers.db')
+    rows = sorted((chat_id, 1, kind, 100.0 + chat_id) for chat_id in CHATS for kind in (0, 1))
+    write(db_path, rows)
+
+    assert rebalance(db_path, 4) == len(rows)
+    assert read(db_path) == []
+    check_layout(db_path, 4, rows)
+    # Файлы уже разложены под четыре шарда: повторный запуск ничего не читает
+    assert rebalance(db_path, 4) == 0
+
+    assert rebalance(db_path, 3) > 0
+    check_layout(db_path, 3, rows)
+    assert read(shard_db_path(db_path, 3)) == []
+
+    assert rebalance(db_path, 5) > 0
+    check_layout(db_path, 5, rows)
+
+    assert rebalance(db_path, 0) == len(rows)
+    assert read(db_path) == rows
+    assert all(not shard_rows for shard_rows in rows_by_shard(db_path, 5))
+
+
+def test_rebalance_picks_up_rows_written_unsharded(tmp_path):
+    db_path = str(tmp_path / 'timers.db')
+    rebalance(db_path, 2)
+    # Бот поработал без шардов, затем снова запущен с двумя
+    rows = [(chat_id, 7, 0, 200.0) for chat_id in CHATS]
+    write(db_path, rows)
+    assert rebalance(db_path, 2) == len(rows)
+    assert read(db_path) == []
+    check_layout(db_path, 2, sorted(rows))
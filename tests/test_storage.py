@@ -0,0 +1,84 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from scheduler import TimerEntry
+from storage import SqliteTimerStore
+
+
+class FlakyStore(SqliteTimerStore):
+    """Хранилище, первые failures записей которого падают."""
+
+    def __init__(self, path, failures, **kwargs):
+        super().__init__(path, **kwargs)
+        self.failures = failures
+
+    def _write_batch(self, journal):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError('database is locked')
+        super()._write_batch(journal)
+
+
+async def stored(path):
+    store = SqliteTimerStore(path)
+    await store.open()
+    try:
+        return sorted(
+            (e.chat_id, e.message_id) for e in
+            await store.load_window(float('-inf'), float('inf'))
+        )
+    finally:
+        await store.close()
+
+
+def test_failed_flush_keeps_journal_in_order(tmp_path):
+    path = str(tmp_path / 'timers.db')
+
+    async def main():
+        store = FlakyStore(path, failures=1)
+        await store.open()
+        store.add([TimerEntry(100, 1, 1), TimerEntry(100, 1, 2)])
+        with pytest.raises(sqlite3.OperationalError):
+            await store.flush()
+        # Отмена после неудачной записи должна примениться после создания
+        store.cancel(1, 2)
+        assert len(store) == 3
+        await store.flush()
+        assert len(store) == 0
+        await store.close()
+        return await stored(path)
+
+    assert asyncio.run(main()) == [(1, 1)]
+
+
+def test_background_flush_retries(tmp_path):
+    path = str(tmp_path / 'timers.db')
+
+    async def main():
+        store = FlakyStore(path, failures=2, flush_interval=0.01, retry_interval=0.01)
+        await store.open()
+        store.start()
+        store.add([TimerEntry(100, 1, 1)])
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if not len(store) and not store.failures:
+                break
+        assert store.failures == 0
+        await store.close()
+        return await stored(path)
+
+    assert asyncio.run(main()) == [(1, 1)]
+
+
+def test_close_closes_connection_when_final_flush_fails(tmp_path):
+    async def main():
+        store = FlakyStore(str(tmp_path / 'timers.db'), failures=1)
+        await store.open()
+        store.add([TimerEntry(100, 1, 1)])
+        with pytest.raises(sqlite3.OperationalError):
+            await store.close()
+        return store._conn
+
+    assert asyncio.run(main()) is None
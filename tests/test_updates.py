@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime, timezone
+
+from telegram import Chat, Message, Update
+
+from updates import ChatOrderedUpdateProcessor
+
+
+def chat_update(update_id, chat_id):
+    chat = Chat(chat_id, Chat.PRIVATE)
+    message = Message(update_id, datetime.now(timezone.utc), chat, text='text')
+    return Update(update_id, message=message)
+
+
+def test_updates_of_one_chat_run_in_order():
+    async def main():
+        processor = ChatOrderedUpdateProcessor(8)
+        order = []
+
+        async def handle(update_id, delay):
+            await asyncio.sleep(delay)
+            order.append(update_id)
+
+        # Первые обновления спят дольше: без блокировки чата порядок бы сменился
+        await asyncio.gather(*(
+            processor.process_update(chat_update(update_id, 1), handle(update_id, delay))
+            for update_id, delay in enumerate((0.03, 0.02, 0.01, 0))
+        ))
+        assert order == [0, 1, 2, 3]
+        assert not processor._chat_locks
+    asyncio.run(main())
+
+
+def test_busy_chat_does_not_stall_others():
+    async def main():
+        processor = ChatOrderedUpdateProcessor(2)
+        release = asyncio.Event()
+        done = []
+
+        async def busy(update_id):
+            await release.wait()
+            done.append(update_id)
+
+        async def quick(update_id):
+            done.append(update_id)
+
+        # Очередь занятого чата длиннее лимита: ждущие обновления не держат слоты
+        busy_tasks = [
+            asyncio.create_task(processor.process_update(chat_update(i, 1), busy(i)))
+            for i in range(5)
+        ]
+        await asyncio.sleep(0)
+        await asyncio.wait_for(
+            processor.process_update(chat_update(10, 2), quick(10)), 1
+        )
+        assert done == [10]
+        release.set()
+        await asyncio.gather(*busy_tasks)
+        assert done == [10, 0, 1, 2, 3, 4]
+    asyncio.run(main())
+
+
+def test_concurrency_limit_is_kept():
+    async def main():
+        processor = ChatOrderedUpdateProcessor(2)
+        running = 0
+        peak = 0
+
+        async def handle():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(*(
+            processor.process_update(chat_update(chat_id, chat_id), handle())
+            for chat_id in range(6)
+        ))
+        assert peak == 2
+    asyncio.run(main())
@@ -1,12 +1,15 @@
+import asyncio
 import logging
 import os
 import time
-import threading
 from datetime import datetime, timedelta
+from functools import lru_cache
 
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     CommandHandler,
     ContextTypes,
@@ -15,6 +18,35 @@ from telegram.ext import (
     filters
 )
 
+from callbacks import (
+    BACK_DATA,
+    IGNORE,
+    MANUAL_DATA,
+    OP_BACK,
+    OP_CANCEL,
+    OP_CANCEL_PAGE,
+    OP_DATE,
+    OP_LIST,
+    OP_MANUAL,
+    OP_MONTH,
+    OP_TIME,
+    CallbackRouter,
+    cancel_data,
+    cancel_page_data,
+    date_data,
+    list_data,
+    month_data,
+    time_data
+)
+import metrics
+from metrics import IGNORED_CALLBACKS, timed
+from scheduler import KIND_REMINDER, TimerEntry
+from service import TimerService
+from session import SessionStore
+from sharding import ShardRouter, rebalance
+from storage import SqliteTimerStore
+from updates import ChatOrderedUpdateProcessor
+
 # Загружаем переменные окружения из .env файла
 load_dotenv()
 
@@ -25,16 +57,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Глобальная переменная для хранения текущей даты
-current_date = datetime.now()
+SESSION_EXPIRED_TEXT = (
+    "Время выбора истекло. Выберите дату заново командой /start."
+)
+
+# Сколько таймеров показывать на одной странице /list и /cancel
+TIMER_PAGE_SIZE = 10
+
+# Сколько готовых клавиатур календаря держать в кэше
+KEYBOARD_CACHE_SIZE = 64
+
+# Смещения напоминаний до события, в секундах
+LONG_EVENT_THRESHOLD = 6 * 30 * 24 * 3600
+LONG_EVENT_INTERVALS = (
+    60 * 24 * 3600 * 2,
+    60 * 24 * 3600,
+    7 * 24 * 3600,
+    3 * 24 * 3600,
+    24 * 3600
+)
+SHORT_EVENT_INTERVALS = (
+    30 * 24 * 3600,
+    7 * 24 * 3600,
+    3 * 24 * 3600,
+    24 * 3600
+)
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отправляет сообщение с кнопками выбора даты для таймера."""
-    global current_date
-    keyboard = generate_calendar_buttons(current_date.year, current_date.month)
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    today = datetime.now()
+    reply_markup = calendar_markup(today.year, today.month)
     await update.message.reply_text(
         'Добро пожаловать в бота для установки таймера!\n\n'
         'Чтобы выбрать дату для таймера, выполните следующие шаги:\n'
@@ -55,64 +108,164 @@ async def timer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+router = CallbackRouter()
+
+
 async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает нажатия кнопок для установки таймера."""
     query = update.callback_query
     await query.answer()
 
-    if query.data.startswith('prev_month'):
-        year, month = map(int, query.data.split('-')[1:])
-        month -= 1
-        if month < 1:
-            month = 12
-            year -= 1
-        keyboard = generate_calendar_buttons(year, month)
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            'Выберите дату для таймера:',
-            reply_markup=reply_markup
-        )
+    # Кнопки без действия не разбираем
+    if query.data == IGNORE or query.data == 'ignore':
+        IGNORED_CALLBACKS.inc()
+        return
 
-    elif query.data.startswith('next_month'):
-        year, month = map(int, query.data.split('-')[1:])
-        month += 1
-        if month > 12:
-            month = 1
-            year += 1
-        keyboard = generate_calendar_buttons(year, month)
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.message.edit_text(
-            'Выберите дату для таймера:',
-            reply_markup=reply_markup
-        )
+    await router.dispatch(update, context)
 
-    elif query.data == 'back':
-        await start(update, context)  # Вернуться к выбору даты
 
-    elif query.data.startswith('date_'):
-        # Получаем выбранную дату
-        selected_date = query.data.split('_')[1]
-        target_date = datetime.strptime(selected_date, '%Y-%m-%d')
+@router.route(OP_MONTH)
+async def show_month(update: Update, context: ContextTypes.DEFAULT_TYPE, year, month):
+    """Переключает календарь на другой месяц."""
+    await update.callback_query.message.edit_text(
+        'Выберите дату для таймера:',
+        reply_markup=calendar_markup(year, month)
+    )
 
-        # Запрашиваем точное время
-        await query.message.reply_text(
-            "Пожалуйста, выберите время для установки таймера "
-            "или введите его в формате ЧЧ:ММ:",
-            reply_markup=generate_time_keyboard()
-        )
-        context.user_data['target_date'] = target_date  # Сохраняем дату для дальнейшего использования
-        return
 
-    elif query.data.startswith('time_'):
-        # Получаем выбранное время
-        time_str = query.data.split('_')[1]
-        await set_timer(context, query, time_str)
-        return
+@router.route(OP_BACK)
+async def back(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Возвращает к выбору даты."""
+    today = datetime.now()
+    await update.callback_query.message.edit_text(
+        'Выберите дату для таймера:',
+        reply_markup=calendar_markup(today.year, today.month)
+    )
 
 
-async def set_timer(context, query, time_str):
-    """Устанавливает таймер на основе выбранного или введенного времени."""
-    target_date = context.user_data['target_date']
+@router.route(OP_DATE)
+async def select_date(update: Update, context: ContextTypes.DEFAULT_TYPE, target_date):
+    """Запоминает выбранную дату и запрашивает точное время."""
+    await update.callback_query.message.reply_text(
+        "Пожалуйста, выберите время для установки таймера "
+        "или введите его в формате ЧЧ:ММ:",
+        reply_markup=generate_time_keyboard()
+    )
+    # Сохраняем дату для дальнейшего использования
+    sessions = context.application.bot_data['sessions']
+    sessions.open(update.effective_user.id).target_date = target_date
+
+
+@router.route(OP_TIME)
+async def select_time(update: Update, context: ContextTypes.DEFAULT_TYPE, hour, minute):
+    """Устанавливает таймер на выбранное время."""
+    await set_timer(context, update.callback_query, hour, minute)
+
+
+@router.route(OP_MANUAL)
+async def select_manual_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Переходит к ручному вводу времени."""
+    await set_timer(context, update.callback_query)
+
+
+async def list_timers(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показывает постраничный список таймеров чата."""
+    text, reply_markup = await timer_page(context, update.effective_chat.id, 0)
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+
+async def cancel_timers(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показывает таймеры чата с кнопками отмены."""
+    text, reply_markup = await timer_page(context, update.effective_chat.id, 0, cancel=True)
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+
+@router.route(OP_LIST)
+async def show_list_page(update: Update, context: ContextTypes.DEFAULT_TYPE, offset):
+    """Листает список таймеров."""
+    query = update.callback_query
+    text, reply_markup = await timer_page(context, query.message.chat_id, offset)
+    await query.message.edit_text(text, reply_markup=reply_markup)
+
+
+@router.route(OP_CANCEL_PAGE)
+async def show_cancel_page(update: Update, context: ContextTypes.DEFAULT_TYPE, offset):
+    """Листает список таймеров для отмены."""
+    query = update.callback_query
+    text, reply_markup = await timer_page(context, query.message.chat_id, offset, cancel=True)
+    await query.message.edit_text(text, reply_markup=reply_markup)
+
+
+@router.route(OP_CANCEL)
+async def cancel_timer(update: Update, context: ContextTypes.DEFAULT_TYPE, message_id, offset):
+    """Отменяет таймер и обновляет страницу списка."""
+    query = update.callback_query
+    chat_id = query.message.chat_id
+    if await context.application.bot_data['timers'].cancel(chat_id, message_id):
+        try:
+            await context.bot.edit_message_text(
+                "Таймер отменен.", chat_id=chat_id, message_id=message_id
+            )
+        except TelegramError as exc:
+            logger.debug("Не удалось изменить сообщение отмененного таймера: %s", exc)
+    text, reply_markup = await timer_page(context, chat_id, offset, cancel=True)
+    await query.message.edit_text(text, reply_markup=reply_markup)
+
+
+async def timer_page(context, chat_id, offset, cancel=False):
+    """Возвращает текст и клавиатуру страницы таймеров чата."""
+    timers = context.application.bot_data['timers']
+    items, total = await timers.page(chat_id, offset, TIMER_PAGE_SIZE)
+    if total and not items:
+        # Страница опустела после отмены — показываем последнюю
+        offset = (total - 1) // TIMER_PAGE_SIZE * TIMER_PAGE_SIZE
+        items, total = await timers.page(chat_id, offset, TIMER_PAGE_SIZE)
+    if not total:
+        return "У вас нет активных таймеров.", None
+
+    page_data = cancel_page_data if cancel else list_data
+    keyboard = []
+    lines = []
+    for number, (due, message_id) in enumerate(items, start=offset + 1):
+        label = datetime.fromtimestamp(due).strftime('%Y-%m-%d %H:%M')
+        if cancel:
+            keyboard.append([InlineKeyboardButton(
+                f"✖ {label}", callback_data=cancel_data(message_id, offset)
+            )])
+        else:
+            lines.append(f"{number}. {label}")
+
+    navigation = []
+    if offset > 0:
+        navigation.append(InlineKeyboardButton(
+            "<<", callback_data=page_data(max(0, offset - TIMER_PAGE_SIZE))
+        ))
+    if offset + TIMER_PAGE_SIZE < total:
+        navigation.append(InlineKeyboardButton(
+            ">>", callback_data=page_data(offset + TIMER_PAGE_SIZE)
+        ))
+    if navigation:
+        keyboard.append(navigation)
+
+    header = f"{offset + 1}–{offset + len(items)} из {total}"
+    if cancel:
+        text = f"Выберите таймер для отмены ({header}):"
+    else:
+        text = f"Ваши таймеры ({header}):\n" + "\n".join(lines)
+    return text, InlineKeyboardMarkup(keyboard) if keyboard else None
+
+
+async def set_timer(context, query, hour=None, minute=None):
+    """
+    Устанавливает таймер на основе выбранного или введенного времени.
+    Без hour и minute запрашивает ручной ввод.
+    """
+    session = context.application.bot_data['sessions'].get(query.from_user.id)
+    if session is None or session.target_date is None:
+        await query.message.reply_text(SESSION_EXPIRED_TEXT)
+        return
+
+    target_date = session.target_date
     event_time = int((target_date - datetime.now()).total_seconds())
 
     if event_time > 24 * 3600:  # Если таймер больше одного дня
@@ -120,53 +273,53 @@ async def set_timer(context, query, time_str):
             "Таймер установлен на более чем один день. "
             "Хотите установить конкретное время? (да/нет)"
         )
-        context.user_data['waiting_for_time_confirmation'] = True
+        session.waiting_for_time_confirmation = True
         return
 
-    if time_str == "manual":
+    if hour is None:
         await query.message.reply_text(
             "Пожалуйста, введите время в формате ЧЧ:ММ:"
         )
         return
 
-    hour, minute = map(int, time_str.split(':'))
     target_date = target_date.replace(hour=hour, minute=minute)
 
-    event_time = int((target_date - datetime.now()).total_seconds())
-
     message = await query.message.reply_text(
         f"Таймер установлен на {target_date.strftime('%Y-%m-%d %H:%M')}."
     )
 
-    threading.Thread(
-        target=run_timer,
-        args=(event_time, query.message.chat_id, message.message_id, context)
-    ).start()
+    schedule_timer(context, query.message.chat_id, message.message_id, target_date)
+    context.application.bot_data['sessions'].discard(query.from_user.id)
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает текстовые сообщения для установки таймера вручную."""
     user_input = update.message.text
-    if 'waiting_for_time_confirmation' in context.user_data:
+    user_id = update.effective_user.id
+    session = context.application.bot_data['sessions'].get(user_id)
+    if session is None or session.target_date is None:
+        await update.message.reply_text(SESSION_EXPIRED_TEXT)
+        return
+
+    if session.waiting_for_time_confirmation:
         if user_input.lower() == "да":
+            session.waiting_for_time_confirmation = False
             await update.message.reply_text(
                 "Пожалуйста, выберите время для установки таймера "
                 "или введите его в формате ЧЧ:ММ:"
             )
             return
         elif user_input.lower() == "нет":
-            target_date = context.user_data['target_date']
-            event_time = int((target_date - datetime.now()).total_seconds())
+            target_date = session.target_date
             message = await update.message.reply_text(
                 f"Таймер установлен на {target_date.strftime('%Y-%m-%d')} "
                 "без указания времени."
             )
 
-            threading.Thread(
-                target=run_timer,
-                args=(event_time, update.message.chat_id, message.message_id, context)
-            ).start()
-            del context.user_data['waiting_for_time_confirmation']
+            schedule_timer(
+                context, update.message.chat_id, message.message_id, target_date
+            )
+            context.application.bot_data['sessions'].discard(user_id)
             return
         else:
             await update.message.reply_text(
@@ -177,20 +330,18 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         hour, minute = map(int, user_input.split(':'))
         if 0 <= hour < 24 and 0 <= minute < 60:
-            target_date = context.user_data['target_date'].replace(
+            target_date = session.target_date.replace(
                 hour=hour,
                 minute=minute
             )
-            event_time = int((target_date - datetime.now()).total_seconds())
-
             message = await update.message.reply_text(
                 f"Таймер установлен на {target_date.strftime('%Y-%m-%d %H:%M')}."
             )
 
-            threading.Thread(
-                target=run_timer,
-                args=(event_time, update.message.chat_id, message.message_id, context)
-            ).start()
+            schedule_timer(
+                context, update.message.chat_id, message.message_id, target_date
+            )
+            context.application.bot_data['sessions'].discard(user_id)
         else:
             await update.message.reply_text(
                 "Пожалуйста, введите время в правильном формате ЧЧ:ММ."
@@ -201,6 +352,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
+@lru_cache(maxsize=1)
 def generate_time_keyboard():
     """
     Генерирует клавиатуру для выбора времени и добавляет
@@ -211,53 +363,42 @@ def generate_time_keyboard():
         for minute in [0, 30]:  # Выбор только полных часов и половин
             time_str = f"{hour:02d}:{minute:02d}"
             keyboard.append([InlineKeyboardButton(
-                time_str, callback_data=f'time_{time_str}')]
+                time_str, callback_data=time_data(hour, minute))]
             )
 
     # Добавляем кнопку для ручного ввода времени
     keyboard.append([InlineKeyboardButton(
-        "Введите время вручную", callback_data='time_manual')]
+        "Введите время вручную", callback_data=MANUAL_DATA)]
     )
     return InlineKeyboardMarkup(keyboard)
 
 
-def run_timer(event_time, chat_id, message_id, context):
-    """Запускает таймер и отправляет сообщение по его истечении."""
-    time.sleep(event_time)
-    context.bot.edit_message_text(
-        chat_id=chat_id,
-        message_id=message_id,
-        text="Таймер завершен! Время события истекло!"
-    )
-    send_notifications(chat_id, event_time, context)
-
-
-def send_notifications(chat_id, event_time, context):
-    """Отправляет уведомления о приближающемся событии."""
-    target_date = datetime.now() + timedelta(seconds=event_time)
-
-    # Логика уведомлений
-    if event_time > 6 * 30 * 24 * 3600:  # Более 6 месяцев
-        intervals = [
-            60 * 24 * 3600,
-            60 * 24 * 3600 * 2,
-            7 * 24 * 3600,
-            3 * 24 * 3600,
-            24 * 3600
-        ]
+def schedule_timer(context, chat_id, message_id, target_date):
+    """Ставит таймер и напоминания в очередь планировщика и в хранилище."""
+    bot_data = context.application.bot_data
+    due = target_date.timestamp()
+    entries = [TimerEntry(due, chat_id, message_id)]
+    entries.extend(reminder_entries(chat_id, message_id, due, time.time()))
+    bot_data['timers'].add(entries)
+
+
+def reminder_entries(chat_id, message_id, due, now):
+    """
+    Разворачивает напоминания о событии в абсолютные моменты срабатывания.
+
+    Смещения берутся из таблиц для событий дальше и ближе 6 месяцев.
+    Уже прошедшие напоминания отбрасываются.
+    """
+    if due - now > LONG_EVENT_THRESHOLD:  # Более 6 месяцев
+        intervals = LONG_EVENT_INTERVALS
     else:  # Менее 6 месяцев
-        intervals = [
-            30 * 24 * 3600,
-            7 * 24 * 3600,
-            3 * 24 * 3600,
-            24 * 3600
-        ]
-
-    for interval in intervals:
-        time.sleep(event_time - interval)  # Ждем до следующего уведомления
-        context.bot.send_message(
-            chat_id=chat_id, text="Напоминание: событие приближается!"
-        )
+        intervals = SHORT_EVENT_INTERVALS
+
+    return [
+        TimerEntry(due - interval, chat_id, message_id, KIND_REMINDER)
+        for interval in intervals
+        if due - interval > now
+    ]
 
 
 def generate_calendar_buttons(year, month):
@@ -266,17 +407,19 @@ def generate_calendar_buttons(year, month):
     month_start = datetime(year, month, 1)
     next_month = month + 1 if month < 12 else 1
     year_end = year if month < 12 else year + 1
+    month_prev = month - 1 if month > 1 else 12
+    year_prev = year if month > 1 else year - 1
     month_end = (datetime(year_end, next_month, 1) - timedelta(days=1)).day
 
     # Добавляем заголовок с днями недели
     keyboard.append([
-        InlineKeyboardButton("Пн", callback_data='ignore'),
-        InlineKeyboardButton("Вт", callback_data='ignore'),
-        InlineKeyboardButton("Ср", callback_data='ignore'),
-        InlineKeyboardButton("Чт", callback_data='ignore'),
-        InlineKeyboardButton("Пт", callback_data='ignore'),
-        InlineKeyboardButton("Сб", callback_data='ignore'),
-        InlineKeyboardButton("Вс", callback_data='ignore')
+        InlineKeyboardButton("Пн", callback_data=IGNORE),
+        InlineKeyboardButton("Вт", callback_data=IGNORE),
+        InlineKeyboardButton("Ср", callback_data=IGNORE),
+        InlineKeyboardButton("Чт", callback_data=IGNORE),
+        InlineKeyboardButton("Пт", callback_data=IGNORE),
+        InlineKeyboardButton("Сб", callback_data=IGNORE),
+        InlineKeyboardButton("Вс", callback_data=IGNORE)
     ])
 
     # Заполняем кнопки датами
@@ -286,39 +429,166 @@ def generate_calendar_buttons(year, month):
         for _ in range(7):  # 7 дней в неделе
             if day <= month_end:
                 row.append(InlineKeyboardButton(
-                    day, callback_data=f'date_{year}-{month:02d}-{day:02d}')
+                    day, callback_data=date_data(year, month, day))
                 )
             else:
-                row.append(InlineKeyboardButton(" ", callback_data='ignore'))
+                row.append(InlineKeyboardButton(" ", callback_data=IGNORE))
             day += 1
         keyboard.append(row)
 
     # Добавляем кнопки для навигации по месяцам
     keyboard.append([
-        InlineKeyboardButton("<<", callback_data=f'prev_month-{year}-{month}'),
-        InlineKeyboardButton(f"{month:02d}/{year}", callback_data='ignore'),
-        InlineKeyboardButton(">>", callback_data=f'next_month-{year}-{month}')
+        InlineKeyboardButton("<<", callback_data=month_data(year_prev, month_prev)),
+        InlineKeyboardButton(f"{month:02d}/{year}", callback_data=IGNORE),
+        InlineKeyboardButton(">>", callback_data=month_data(year_end, next_month))
     ])
 
-    keyboard.append([InlineKeyboardButton("Назад", callback_data='back')])
+    keyboard.append([InlineKeyboardButton("Назад", callback_data=BACK_DATA)])
     return keyboard
 
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def calendar_markup(year, month):
+    """Возвращает готовую неизменяемую клавиатуру календаря на месяц."""
+    return InlineKeyboardMarkup(generate_calendar_buttons(year, month))
+
+
+def warm_keyboard_cache(around, months=12):
+    """Заранее строит клавиатуры на months месяцев до и после даты around."""
+    generate_time_keyboard()
+    base = around.year * 12 + around.month - 1
+    for index in range(base - months, base + months + 1):
+        calendar_markup(index // 12, index % 12 + 1)
+
+
+def keyboard_cache_stats():
+    """Возвращает счетчики попаданий и промахов кэша клавиатур."""
+    stats = {}
+    for name, func in (('calendar', calendar_markup), ('time', generate_time_keyboard)):
+        info = func.cache_info()
+        stats[name] = {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'maxsize': info.maxsize,
+        }
+    return stats
+
+
+async def post_init(application: Application):
+    """Восстанавливает таймеры из хранилища и запускает планировщик."""
+    warm_keyboard_cache(datetime.now())
+    db_path = os.getenv('TIMER_DB_PATH', 'timers.db')
+    send_rate = float(os.getenv('SEND_RATE', '30'))
+    shards = int(os.getenv('TIMER_SHARDS', '0'))
+    horizon = float(os.getenv('TIMER_HORIZON', '3600'))
+    metrics_port = os.getenv('METRICS_PORT')
+    metrics_address = None
+    if metrics_port:
+        metrics_address = (os.getenv('METRICS_HOST', '127.0.0.1'), int(metrics_port))
+
+    moved = await asyncio.to_thread(rebalance, db_path, shards)
+    if moved:
+        logger.info("Перенесено таймеров под число шардов %d: %d", shards, moved)
+
+    if shards > 0:
+        bot = application.bot
+        base_url = os.getenv('TELEGRAM_BASE_URL')
+        timers = ShardRouter(
+            shards, bot.token, db_path, base_url, send_rate, metrics_address, horizon
+        )
+    else:
+        timers = TimerService(
+            application.bot, SqliteTimerStore(db_path), send_rate, horizon=horizon
+        )
+    await timers.start()
+    sessions = SessionStore(ttl=int(os.getenv('SESSION_TTL', '900')))
+    sessions.start()
+
+    application.bot_data['timers'] = timers
+    application.bot_data['sessions'] = sessions
+
+    if metrics_address:
+        register_metrics(metrics.REGISTRY, timers, sessions)
+        application.bot_data['metrics_server'] = await metrics.serve(*metrics_address)
+
+
+def register_metrics(registry, timers, sessions):
+    """Регистрирует метрики таймеров, сессий и кэша клавиатур."""
+    timers.register_metrics(registry)
+    registry.collector(
+        'timerbot_sessions_live', 'Живых сессий выбора даты и времени',
+        lambda: len(sessions)
+    )
+    registry.collector(
+        'timerbot_sessions_evicted_total', 'Сессий, удаленных по TTL',
+        lambda: sessions.evicted, kind='counter'
+    )
+    registry.collector(
+        'timerbot_keyboard_cache_hits_total', 'Попадания в кэш клавиатур',
+        lambda: {name: stats['hits'] for name, stats in keyboard_cache_stats().items()},
+        kind='counter', label='cache'
+    )
+    registry.collector(
+        'timerbot_keyboard_cache_misses_total', 'Промахи кэша клавиатур',
+        lambda: {name: stats['misses'] for name, stats in keyboard_cache_stats().items()},
+        kind='counter', label='cache'
+    )
+
+
+async def post_shutdown(application: Application):
+    """Останавливает таймеры и сессии, сбрасывая журнал таймеров на диск."""
+    metrics_server = application.bot_data.get('metrics_server')
+    if metrics_server is not None:
+        metrics_server.close()
+    timers = application.bot_data.get('timers')
+    if timers is not None:
+        await timers.stop()
+    sessions = application.bot_data.get('sessions')
+    if sessions is not None:
+        await sessions.stop()
+
+
 def main():
     """Основная функция для запуска бота."""
     TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-
-    application = ApplicationBuilder().token(TOKEN).build()
-
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("timer", timer))
+    mode = os.getenv('BOT_MODE', 'polling').lower()
+    max_concurrent_updates = int(os.getenv('MAX_CONCURRENT_UPDATES', '64'))
+
+    builder = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        .concurrent_updates(ChatOrderedUpdateProcessor(max_concurrent_updates))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    base_url = os.getenv('TELEGRAM_BASE_URL')
+    if base_url:
+        builder = builder.base_url(base_url)
+    application = builder.build()
+
+    application.add_handler(CommandHandler("start", timed('command:start')(start)))
+    application.add_handler(CommandHandler("timer", timed('command:timer')(timer)))
+    application.add_handler(CommandHandler("list", timed('command:list')(list_timers)))
+    application.add_handler(CommandHandler("cancel", timed('command:cancel')(cancel_timers)))
     application.add_handler(CallbackQueryHandler(button))
     application.add_handler(MessageHandler(
         filters.TEXT & ~filters.COMMAND,
-        handle_message)
+        timed('message')(handle_message))
     )
 
-    application.run_polling()
+    if mode == 'webhook':
+        url_path = os.getenv('WEBHOOK_PATH', 'telegram')
+        application.run_webhook(
+            listen=os.getenv('WEBHOOK_LISTEN', '0.0.0.0'),
+            port=int(os.getenv('WEBHOOK_PORT', '8443')),
+            url_path=url_path,
+            webhook_url=os.getenv('WEBHOOK_URL') or None,
+            secret_token=os.getenv('WEBHOOK_SECRET') or None,
+            max_connections=min(max_concurrent_updates, 100),
+        )
+    else:
+        application.run_polling()
 
 
 if __name__ == '__main__':
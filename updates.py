@@ -0,0 +1,62 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# Лимит для семафора базового класса: реальный лимит держит _slots
+_UNLIMITED = 2 ** 31 - 1
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений с сохранением порядка внутри чата.
+
+    Обновления разных чатов обрабатываются одновременно, не более
+    max_concurrent_updates штук. Обновления одного чата выполняются
+    строго по очереди под блокировкой этого чата.
+
+    Слот берется уже под блокировкой чата: иначе обновления, ждущие
+    занятый чат, держали бы слоты, и один активный чат останавливал бы
+    все остальные. Поэтому семафор базового класса фактически отключен.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        # Базовый класс строит свой семафор по max_concurrent_updates
+        self._limit = _UNLIMITED
+        super().__init__(_UNLIMITED)
+        self._limit = max_concurrent_updates
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._chat_locks = {}  # chat_id -> [asyncio.Lock, число ожидающих]
+
+    @property
+    def max_concurrent_updates(self):
+        """Настоящий лимит одновременно обрабатываемых обновлений."""
+        return self._limit
+
+    async def do_process_update(self, update, coroutine):
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._chat_locks.get(chat.id)
+        if entry is None:
+            entry = self._chat_locks[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._slots:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[chat.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass